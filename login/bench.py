@@ -0,0 +1,277 @@
+"""
+Benchmarks for the login app. Each benchmark runs against generated
+users, and a SQLite database in a temporary directory.
+
+Usage: python bench.py <benchmark> [options]
+
+Run `python bench.py --help` for the list of benchmarks.
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import bcrypt
+
+# Point the app at a scratch database before importing it.
+os.environ["LOGIN_DB"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from login_app.user_store import MemoryUserStore, SqliteUserStore  # noqa: E402
+from login_app.password_pool import PasswordPool, PoolBusy  # noqa: E402
+from login_app.users_db import user_store  # noqa: E402
+from login_app import tokens  # noqa: E402
+from login_app.rate_limit import SlidingWindowLimiter  # noqa: E402
+
+
+def generate_users(n):
+    # The password hashes are placeholders: hashing a million
+    # passwords with bcrypt would take days.
+    return [
+        dict(
+            name=f"User {i}",
+            username=f"user{i}",
+            password="$2b$12$" + "x" * 53,
+            salt="$2b$12$" + "x" * 22,
+            token=uuid.uuid4().hex,
+            token_expires=int(time.time()) + tokens.token_lifetime,
+        )
+        for i in range(n)
+    ]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def report(name, latencies):
+    print(
+        f"{name:<24} calls={len(latencies):<7} "
+        f"avg={sum(latencies) / len(latencies) * 1000:.3f}ms "
+        f"p95={percentile(latencies, 0.95) * 1000:.3f}ms"
+    )
+
+
+def time_calls(fn, calls, seed=0):
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn(rng)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_lookup(args):
+    """
+    Looking up users by token and by username: scanning a list, as
+    `users_db.py` did, vs. the in-memory and SQLite stores.
+    """
+    for n in args.users:
+        users = generate_users(n)
+        tokens = [user["token"] for user in users]
+        usernames = [user["username"] for user in users]
+
+        start = time.perf_counter()
+        memory = MemoryUserStore(users)
+        print(f"\n{n} users, memory store built in {time.perf_counter() - start:.2f}s")
+
+        db = os.path.join(tempfile.mkdtemp(), "users.db")
+        start = time.perf_counter()
+        store = SqliteUserStore(db)
+        store.add_many(users)
+        print(f"SQLite store built in {time.perf_counter() - start:.2f}s")
+
+        def scan_token(rng):
+            token = rng.choice(tokens)
+            return next((user for user in users if user["token"] == token), None)
+
+        # Scans of large lists are slow, so time fewer of them.
+        scans = max(1, min(args.calls, 10_000_000 // n))
+        report("token, list scan", time_calls(scan_token, scans))
+        for name, fn in [
+            ("token, memory", lambda rng: memory.get_by_token(rng.choice(tokens))),
+            ("token, sqlite", lambda rng: store.get_by_token(rng.choice(tokens))),
+            (
+                "username, memory",
+                lambda rng: memory.get_by_username(rng.choice(usernames)),
+            ),
+            (
+                "username, sqlite",
+                lambda rng: store.get_by_username(rng.choice(usernames)),
+            ),
+        ]:
+            report(name, time_calls(fn, args.calls))
+
+
+def run_burst(check, logins):
+    """
+    Runs `check()` on `logins` threads at once, like a burst of login
+    tasks, while a ticker thread, standing in for the render loop,
+    measures how late its 10ms sleeps wake up. Returns the latency of
+    each check, how many were rejected, and the ticker's lateness.
+    """
+    latencies = []
+    rejected = []
+    lateness = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def login():
+        start = time.perf_counter()
+        try:
+            check()
+        except PoolBusy:
+            with lock:
+                rejected.append(time.perf_counter() - start)
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            time.sleep(0.01)
+            lateness.append(time.perf_counter() - start - 0.01)
+
+    tick = threading.Thread(target=ticker)
+    tick.start()
+    threads = [threading.Thread(target=login) for _ in range(logins)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    tick.join()
+    return latencies, rejected, lateness
+
+
+def bench_verify(args):
+    """
+    A burst of `--logins` concurrent password checks: hashing on each
+    login's task thread, as `check_login` did, vs. on the password
+    pool.
+    """
+    hashed = bcrypt.hashpw(b"1234", bcrypt.gensalt(args.cost))
+    print(f"{args.logins} logins at cost {args.cost}, {os.cpu_count()} cores")
+
+    latencies, _, lateness = run_burst(
+        lambda: bcrypt.hashpw(b"1234", hashed) == hashed, args.logins
+    )
+    report("hashpw on threads", latencies)
+    report("  ticker lateness", lateness)
+
+    pool = PasswordPool(args.workers, args.queue)
+    # Start the workers before timing.
+    pool.checkpw(b"1234", hashed)
+    latencies, rejected, lateness = run_burst(
+        lambda: pool.checkpw(b"1234", hashed), args.logins
+    )
+    report("checkpw on the pool", latencies)
+    if rejected:
+        report("  rejected", rejected)
+    report("  ticker lateness", lateness)
+    print(pool.metrics())
+
+
+def bench_tokens(args):
+    """
+    Validating auto-login tokens with the largest of `--users` users
+    in the app's SQLite store: looking the token up in the store, vs.
+    hits in the token cache.
+    """
+    n = max(args.users)
+    user_store.add_many(generate_users(n))
+    # The tokens of the users who visit the app, which fit in the cache.
+    rng = random.Random(0)
+    active = [
+        user_store.get_by_username(f"user{rng.randrange(n)}")["token"]
+        for _ in range(1000)
+    ]
+    print(f"{n} users, {len(active)} active")
+
+    def uncached(rng):
+        user = user_store.get_by_token(rng.choice(active))
+        return user if not tokens.is_expired(user) else None
+
+    report("store lookup", time_calls(uncached, args.calls))
+
+    def miss(rng):
+        tokens.token_cache.clear()
+        return tokens.validate_token(rng.choice(active))
+
+    report("cache miss", time_calls(miss, args.calls))
+    for token in active:
+        tokens.validate_token(token)
+    report(
+        "cache hit",
+        time_calls(lambda rng: tokens.validate_token(rng.choice(active)), args.calls),
+    )
+
+
+def bench_ratelimit(args):
+    """
+    The cost of rate limiting login attempts, against a limiter
+    tracking `max(--users)` keys, and of evicting them.
+    """
+    n = max(args.users)
+    limiter = SlidingWindowLimiter(limit=5, window=60.0)
+    now = time.time()
+    start = time.perf_counter()
+    for i in range(n):
+        limiter.add(f"user{i}", now)
+    print(f"{n} keys added in {time.perf_counter() - start:.2f}s")
+
+    def attempt(rng):
+        key = f"user{rng.randrange(n)}"
+        if limiter.allows(key, now):
+            limiter.add(key, now)
+
+    report("allowed attempt", time_calls(attempt, args.calls))
+    # Use up one key's attempts.
+    for _ in range(limiter.limit):
+        limiter.add("attacker", now)
+    report(
+        "rejected attempt",
+        time_calls(lambda rng: limiter.allows("attacker", now), args.calls),
+    )
+
+    # The next window but one: every key is old enough to evict.
+    start = time.perf_counter()
+    limiter.add("user0", now + 2 * limiter.window)
+    report("evict", [time.perf_counter() - start])
+    print(f"{len(limiter.counts)} keys left")
+
+
+benchmarks = {
+    "ratelimit": bench_ratelimit,
+    "tokens": bench_tokens,
+    "lookup": bench_lookup,
+    "verify": bench_verify,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the login app.")
+    parser.add_argument("benchmark", choices=sorted(benchmarks))
+    parser.add_argument(
+        "--users",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[1000, 100_000, 1_000_000],
+        help="Comma-separated user counts.",
+    )
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--cost", type=int, default=12, help="bcrypt cost.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--queue", type=int, default=None, help="Pool queue size.")
+    args = parser.parse_args()
+    benchmarks[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import math
+import time
+import bcrypt
+
+
+def hash_cost(hashed_password):
+    """The cost of a bcrypt hash, like 12 in `$2b$12$...`."""
+    return int(hashed_password.split("$")[2])
+
+
+def calibrate_cost(target=0.25, min_cost=10, max_cost=16, probe_cost=8):
+    """
+    Returns the bcrypt cost whose hashes take closest to `target`
+    seconds on this machine, between `min_cost` and `max_cost`. Each
+    step of cost doubles the time a hash takes, so this times a hash at
+    a cheap `probe_cost`, and works out the rest.
+    """
+    salt = bcrypt.gensalt(probe_cost)
+    elapsed = math.inf
+    # The fastest of a few runs, since the first may be slowed down by
+    # whatever else the machine is doing at startup.
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibrate", salt)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    cost = probe_cost + round(math.log2(target / elapsed))
+    return max(min_cost, min(max_cost, cost))
@@ -1,13 +1,19 @@
 import hyperdiv as hd
-from .users_db import get_user_by_token, check_login
+from .users_db import check_login
+from .tokens import validate_token, refresh_token, revoke_token
+from .rate_limit import allow_login, client_address
 
 
 def log_user_in(state, user):
+    # Replace the user's token if it is old, so it doesn't expire
+    # while they are using the app.
+    user = refresh_token(user)
     state.logged_in_user = user
     hd.local_storage.set_item("auth_token", user["token"])
 
 
 def log_user_out(state):
+    revoke_token(state.logged_in_user["token"])
     state.logged_in_user = None
     hd.local_storage.remove_item("auth_token")
 
@@ -20,12 +26,12 @@ def login_dialog(state):
 
     if token_request.done:
         if token_request.result:
-            user = get_user_by_token(token_request.result)
+            user = validate_token(token_request.result)
             if user:
                 # If a valid token is in local storage, we
                 # automatically log the user in, without showing the
                 # login form.
-                state.logged_in_user = user
+                log_user_in(state, user)
                 return
 
         # The login failure alert. This is `collec=False` because we
@@ -38,6 +44,16 @@ def login_dialog(state):
             collect=False,
         )
 
+        # Shown when the password couldn't be checked, like when too
+        # many logins are being checked at once, or when there were too
+        # many login attempts.
+        busy_alert = hd.alert(
+            "Couldn't log in right now. Please try again in a moment.",
+            variant="warning",
+            duration=3000,
+            collect=False,
+        )
+
         # This task is used to asynchronously check the password on
         # successful form submission.
         check_password_task = hd.task()
@@ -69,20 +85,30 @@ def login_dialog(state):
                     # In case the failure alert is open from a
                     # previous failed login, close it.
                     failure_alert.opened = False
-                    # Launch the password checking task.
-                    check_password_task.rerun(
-                        check_login,
-                        user_name.value,
-                        password.value,
-                    )
-
-            # Render the failure alert.
+                    busy_alert.opened = False
+                    # Turn the attempt away before it costs a password
+                    # hash, if there were too many recent attempts for
+                    # this user name or from this client.
+                    if not allow_login(user_name.value, client_address()):
+                        busy_alert.opened = True
+                    else:
+                        # Launch the password checking task.
+                        check_password_task.rerun(
+                            check_login,
+                            user_name.value,
+                            password.value,
+                        )
+
+            # Render the alerts.
             failure_alert.collect()
+            busy_alert.collect()
 
         # When the password checking task completes:
         if check_password_task.finished:
             user = check_password_task.result
-            if user:
+            if check_password_task.error:
+                busy_alert.opened = True
+            elif user:
                 # If password checking succeeded, log the user in.
                 log_user_in(state, user)
                 form.reset()
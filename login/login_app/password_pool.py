@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+
+
+class PoolBusy(Exception):
+    """Raised when the password pool's queue is full."""
+
+
+def timed_call(fn, *args):
+    """
+    Runs in a worker process. Returns what `fn(*args)` returns, when
+    the call started, and how long it took.
+    """
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time() - started
+
+
+class Timing:
+    """The count, total and maximum of a series of durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        return dict(
+            count=self.count,
+            avg=self.total / self.count if self.count else 0.0,
+            max=self.max,
+        )
+
+
+class PasswordPool:
+    """
+    Checks and hashes passwords on a pool of `workers` processes (by
+    default, one per core), so that a burst of logins can't run more
+    bcrypt hashes at once than there are cores, starving the app's
+    render loop.
+
+    Up to `queue_size` calls wait for a worker. When the queue is
+    full, `checkpw` and `hashpw` raise `PoolBusy` right away, rather
+    than making the login wait behind the queue.
+
+    `checkpw_async` and `hashpw_async` wait for the worker without
+    holding a thread. Use them from `hd.task`s: Hyperdiv runs regular
+    tasks on a few threads shared by every session, which a burst of
+    logins waiting on the pool would fill up, stalling every other
+    task in the app.
+    """
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = self.workers * 4 if queue_size is None else queue_size
+        self.lock = threading.Lock()
+        self.executor = None
+        # Checks submitted and not yet finished.
+        self.in_flight = 0
+        self.rejected = 0
+        # How many times the workers had to be replaced.
+        self.broken = 0
+        # Time spent waiting for a worker, and hashing.
+        self.queue_wait = Timing()
+        self.hash_time = Timing()
+
+    def get_executor(self):
+        # Worker processes are started on first use. The app runs
+        # threads, which forking copies in whatever state they are in,
+        # so workers start from a fresh process where possible.
+        if self.executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self.executor
+
+    def checkpw(self, password, hashed_password):
+        """
+        Like `bcrypt.checkpw`, on a worker process. Blocks the calling
+        thread until the check is done.
+        """
+        return self.run(bcrypt.checkpw, password, hashed_password)
+
+    def hashpw(self, password, salt):
+        """Like `bcrypt.hashpw`, on a worker process."""
+        return self.run(bcrypt.hashpw, password, salt)
+
+    async def checkpw_async(self, password, hashed_password):
+        """Like `checkpw`, but awaits the check."""
+        return await self.run_async(bcrypt.checkpw, password, hashed_password)
+
+    async def hashpw_async(self, password, salt):
+        """Like `hashpw`, but awaits the hash."""
+        return await self.run_async(bcrypt.hashpw, password, salt)
+
+    def run(self, fn, *args):
+        self.admit()
+        try:
+            submitted = time.time()
+            result, started, hash_time = self.submit(fn, *args)
+        finally:
+            self.release()
+        self.record(submitted, started, hash_time)
+        return result
+
+    async def run_async(self, fn, *args):
+        self.admit()
+        try:
+            submitted = time.time()
+            result, started, hash_time = await self.submit_async(fn, *args)
+        finally:
+            self.release()
+        self.record(submitted, started, hash_time)
+        return result
+
+    def admit(self):
+        """Counts a call in flight, or raises `PoolBusy`."""
+        with self.lock:
+            if self.in_flight >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise PoolBusy("Too many passwords are being checked.")
+            self.in_flight += 1
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def record(self, submitted, started, hash_time):
+        with self.lock:
+            self.queue_wait.add(max(0.0, started - submitted))
+            self.hash_time.add(hash_time)
+
+    def submit(self, fn, *args, retries=1):
+        """
+        Runs `fn(*args)` on a worker with `timed_call`. If a worker
+        died, like when it was killed for using too much memory, the
+        executor can't be used anymore, so it is replaced, and the call
+        is retried.
+        """
+        with self.lock:
+            executor = self.get_executor()
+        try:
+            return executor.submit(timed_call, fn, *args).result()
+        except BrokenProcessPool:
+            self.discard(executor, retries)
+            return self.submit(fn, *args, retries=retries - 1)
+
+    async def submit_async(self, fn, *args, retries=1):
+        """Like `submit`, but awaits the call."""
+        with self.lock:
+            executor = self.get_executor()
+        try:
+            future = executor.submit(timed_call, fn, *args)
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self.discard(executor, retries)
+            return await self.submit_async(fn, *args, retries=retries - 1)
+
+    def discard(self, executor, retries):
+        """
+        Drops a broken executor, so that the next call starts new
+        workers, and raises `PoolBusy` if there are no `retries` left.
+        """
+        with self.lock:
+            self.broken += 1
+            # Unless another call replaced it already.
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+        if retries == 0:
+            raise PoolBusy("The password workers stopped unexpectedly.")
+
+    def metrics(self):
+        with self.lock:
+            return dict(
+                workers=self.workers,
+                in_flight=self.in_flight,
+                rejected=self.rejected,
+                broken=self.broken,
+                queue_wait=self.queue_wait.summary(),
+                hash_time=self.hash_time.summary(),
+            )
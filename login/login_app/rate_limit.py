@@ -0,0 +1,119 @@
+import time
+import threading
+import hyperdiv as hd
+from hyperdiv.frame import AppRunnerFrame
+
+
+class SlidingWindowLimiter:
+    """
+    Allows up to `limit` attempts per key in any `window` seconds.
+
+    Rather than the time of every attempt, each key keeps two counts:
+    attempts in the current fixed window, and in the one before. The
+    attempts in the last `window` seconds are estimated as the current
+    count plus the previous count weighted by how much of the previous
+    window the sliding window still covers. That's three numbers per
+    key, however many attempts are made.
+
+    Keys whose counts are all older than two windows are evicted once
+    per window, when an attempt is made.
+    """
+
+    def __init__(self, limit, window=60.0):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        # Maps each key to `[window_number, count, previous_count]`.
+        self.counts = {}
+        self.evicted_window = 0
+
+    def estimate(self, key, now):
+        window_number, offset = divmod(now, self.window)
+        counts = self.counts.get(key)
+        if counts is None:
+            return 0.0
+        number, count, previous = counts
+        if number == window_number - 1:
+            count, previous = 0, count
+        elif number != window_number:
+            return 0.0
+        return count + previous * (1 - offset / self.window)
+
+    def allows(self, key, now=None):
+        """Whether an attempt for `key` would be allowed."""
+        now = time.time() if now is None else now
+        with self.lock:
+            return self.estimate(key, now) < self.limit
+
+    def add(self, key, now=None):
+        """Counts an attempt for `key`."""
+        now = time.time() if now is None else now
+        window_number = now // self.window
+        with self.lock:
+            counts = self.counts.get(key)
+            if counts is None or counts[0] < window_number - 1:
+                counts = self.counts[key] = [window_number, 0, 0]
+            elif counts[0] == window_number - 1:
+                counts[:] = [window_number, 0, counts[1]]
+            counts[1] += 1
+            if window_number > self.evicted_window:
+                self.evict(window_number)
+
+    def evict(self, window_number):
+        self.evicted_window = window_number
+        for key in [k for k, c in self.counts.items() if c[0] < window_number - 1]:
+            del self.counts[key]
+
+
+# Login attempts allowed per minute, for each username, and for each
+# client address, which may be shared by several users.
+username_limiter = SlidingWindowLimiter(limit=5, window=60.0)
+client_limiter = SlidingWindowLimiter(limit=20, window=60.0)
+lock = threading.Lock()
+
+
+def allow_login(username, client):
+    """
+    Whether a login attempt for `username` from `client` is allowed,
+    in which case it is counted. Rejected attempts aren't counted, so
+    retrying while rejected doesn't extend the wait.
+    """
+    with lock:
+        now = time.time()
+        if not username_limiter.allows(username, now):
+            return False
+        if client is not None and not client_limiter.allows(client, now):
+            return False
+        username_limiter.add(username, now)
+        if client is not None:
+            client_limiter.add(client, now)
+        return True
+
+
+# Whether `client_address` has warned that it can't find addresses.
+warned_no_address = False
+
+
+def client_address():
+    """
+    The IP address of the current session's client, or None if it
+    can't be found, in which case only the per-username limit applies.
+
+    Hyperdiv has no public API for the client's address, so this
+    reads it from internals: the session's websocket connection, a
+    Tornado handler, through the private `_app_runner` of the current
+    frame. This is the only place the app does that. If a Hyperdiv
+    upgrade changes these internals, a warning is logged, once.
+    """
+    global warned_no_address
+    try:
+        connection = AppRunnerFrame.current()._app_runner.connection
+        return connection.request.remote_ip
+    except (RuntimeError, AttributeError) as e:
+        if not warned_no_address:
+            warned_no_address = True
+            hd.logger.warn(
+                f"Can't find client addresses ({e!r}), so login attempts "
+                "are only rate limited per username."
+            )
+        return None
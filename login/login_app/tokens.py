@@ -0,0 +1,108 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from .users_db import user_store
+
+# Auth tokens expire `token_lifetime` seconds after they are issued.
+# A token is replaced with a new one when the user logs in during the
+# second half of its lifetime, so active users stay logged in. Tokens
+# without an expiry, like the mock users' tokens, don't expire, but
+# are replaced at the next login.
+token_lifetime = 30 * 24 * 3600
+
+
+class TokenCache:
+    """
+    An LRU cache of up to `max_size` validated tokens and their users.
+    Entries are trusted for `ttl` seconds, after which the token is
+    validated against the user store again. The TTL bounds how long a
+    token revoked by another process can still be used here.
+    """
+
+    def __init__(self, max_size=10_000, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # Maps each token to its user and when it was cached.
+        self.entries = OrderedDict()
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            user, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl or is_expired(user):
+                del self.entries[token]
+                return None
+            self.entries.move_to_end(token)
+            return user
+
+    def put(self, token, user):
+        with self.lock:
+            self.entries[token] = (user, time.monotonic())
+            self.entries.move_to_end(token)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, token):
+        with self.lock:
+            self.entries.pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def is_expired(user, now=None):
+    expires = user.get("token_expires")
+    return expires is not None and expires <= (now or time.time())
+
+
+def validate_token(token):
+    """Returns the user with this token, if the token is valid."""
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    user = user_store.get_by_token(token)
+    if user is None or is_expired(user):
+        return None
+    token_cache.put(token, user)
+    return user
+
+
+def issue_token(user):
+    """Gives the user a new token, and returns the updated user."""
+    token_cache.invalidate(user["token"])
+    user_store.update(
+        user["username"],
+        token=uuid.uuid4().hex,
+        token_expires=int(time.time()) + token_lifetime,
+    )
+    return user_store.get_by_username(user["username"])
+
+
+def refresh_token(user):
+    """
+    Replaces the user's token if it is past half its lifetime, and
+    returns the user, updated or not.
+    """
+    expires = user.get("token_expires")
+    if expires is None or expires - time.time() < token_lifetime / 2:
+        return issue_token(user)
+    return user
+
+
+def revoke_token(token):
+    """
+    Revokes the token, by giving its user a new one that was never
+    sent to a browser. This logs the user out in every browser.
+    """
+    token_cache.invalidate(token)
+    user = user_store.get_by_token(token)
+    if user is not None:
+        issue_token(user)
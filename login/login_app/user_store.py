@@ -0,0 +1,129 @@
+import threading
+from hyperdiv.sqlite import sqlite, sqlite_tx, migrate, sql
+
+# The fields of a user "row". See `users_db.py` and `tokens.py`.
+user_fields = ("name", "username", "password", "salt", "token", "token_expires")
+
+
+class MemoryUserStore:
+    """
+    Users held in memory, indexed by username and by token, so looking
+    up a user takes the same time however many users there are.
+    """
+
+    def __init__(self, users=()):
+        self.lock = threading.Lock()
+        self.by_username = {}
+        self.by_token = {}
+        for user in users:
+            self.add(user)
+
+    def __len__(self):
+        return len(self.by_username)
+
+    def add(self, user):
+        with self.lock:
+            if user["username"] in self.by_username:
+                raise ValueError(f"User {user['username']} already exists.")
+            user = dict(user)
+            self.by_username[user["username"]] = user
+            self.by_token[user["token"]] = user
+
+    def add_many(self, users):
+        for user in users:
+            self.add(user)
+
+    def update(self, username, **changes):
+        """Updates the user's fields, keeping the indexes consistent."""
+        with self.lock:
+            user = self.by_username.get(username)
+            if user is None:
+                return
+            # Users are replaced rather than changed in place, since
+            # callers may hold on to them.
+            updated = dict(user, **changes)
+            if updated["token"] != user["token"]:
+                del self.by_token[user["token"]]
+            self.by_username[username] = updated
+            self.by_token[updated["token"]] = updated
+
+    def get_by_username(self, username):
+        return self.by_username.get(username)
+
+    def get_by_token(self, token):
+        return self.by_token.get(token)
+
+
+class SqliteUserStore:
+    """
+    Users stored in a SQLite database, with the same interface as
+    `MemoryUserStore`. The table's primary key and unique index on
+    token are its indexes.
+    """
+
+    migrations = [
+        sql(
+            """
+            create table User (
+                username text primary key,
+                name text,
+                password text,
+                salt text,
+                token text unique
+            )
+            """
+        ),
+        sql("alter table User add column token_expires int"),
+    ]
+
+    def __init__(self, db, users=()):
+        self.db = db
+        migrate(db, self.migrations)
+        for user in users:
+            if self.get_by_username(user["username"]) is None:
+                self.add(user)
+
+    def __len__(self):
+        with sqlite(self.db) as (_, cursor):
+            cursor.execute("select count(*) as n from User")
+            return cursor.fetchone()["n"]
+
+    def add(self, user):
+        self.add_many([user])
+
+    def add_many(self, users):
+        with sqlite_tx(self.db) as (_, cursor):
+            cursor.executemany(
+                """
+                insert into User (
+                    name, username, password, salt, token, token_expires
+                )
+                values (?, ?, ?, ?, ?, ?)
+                """,
+                [tuple(user.get(field) for field in user_fields) for user in users],
+            )
+
+    def update(self, username, **changes):
+        # Only known fields, since they are interpolated into the SQL.
+        columns = [field for field in changes if field in user_fields]
+        if not columns:
+            return
+        with sqlite_tx(self.db) as (_, cursor):
+            cursor.execute(
+                f"""
+                update User set {", ".join(f"{c} = ?" for c in columns)}
+                where username = ?
+                """,
+                [changes[c] for c in columns] + [username],
+            )
+
+    def get_by(self, field, value):
+        with sqlite(self.db) as (_, cursor):
+            cursor.execute(f"select * from User where {field} = ?", (value,))
+            return cursor.fetchone()
+
+    def get_by_username(self, username):
+        return self.get_by("username", username)
+
+    def get_by_token(self, token):
+        return self.get_by("token", token)
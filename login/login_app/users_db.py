@@ -1,4 +1,8 @@
+import os
 import bcrypt
+from .user_store import MemoryUserStore, SqliteUserStore
+from .password_pool import PasswordPool, PoolBusy
+from .hash_cost import hash_cost, calibrate_cost
 
 # A mock, in-memory "database" of users. Each "row" includes the
 # user's hashed password, the salt used to generate the password hash,
@@ -7,8 +11,8 @@ import bcrypt
 # user on subsequent visits. Separating the token from the password in
 # principle allows "expiring" tokens without affecting the login info,
 # and allows auto-logging-in users without storing the password hash
-# or salt in the browser. Token expiration is not demonstrated in this
-# demo app.
+# or salt in the browser. Tokens are expired and replaced as described
+# in `tokens.py`.
 users = [
     dict(
         name="Bob",
@@ -27,29 +31,40 @@ users = [
 ]
 
 
+# The users, indexed by username and token. Set the `LOGIN_DB`
+# environment variable to keep them in a SQLite database instead of in
+# memory. The users above are added to it if missing.
+login_db = os.environ.get("LOGIN_DB")
+user_store = SqliteUserStore(login_db, users) if login_db else MemoryUserStore(users)
+
+
 def get_user_by_token(token):
-    return next((user for user in users if user["token"] == token), None)
+    return user_store.get_by_token(token)
 
 
 def get_user_by_username(username):
-    return next(
-        (user for user in users if user["username"] == username),
-        None,
-    )
+    return user_store.get_by_username(username)
+
+
+# The bcrypt cost of new password hashes, picked at startup so that
+# checking a password takes about `LOGIN_HASH_TIME` seconds (0.25 by
+# default) on this machine. Set `LOGIN_HASH_COST` to pick it yourself.
+password_cost = int(os.environ.get("LOGIN_HASH_COST") or 0) or calibrate_cost(
+    float(os.environ.get("LOGIN_HASH_TIME", 0.25))
+)
 
 
 def gen_salted_password(passwd):
     """
-    This function is unused in the app but was used to generate the
-    hashed password and salt stored for each user in the
-    'database'. Here for reference.
+    This function was used to generate the hashed password and salt
+    stored for each user in the 'database'. Here for reference.
     """
 
     # Encode password to bytes
     passwd_bytes = passwd.encode("utf-8")
 
     # Generate salt
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(password_cost)
 
     # Hash the password with the salt
     hashed_passwd = bcrypt.hashpw(passwd_bytes, salt)
@@ -58,28 +73,56 @@ def gen_salted_password(passwd):
     return hashed_passwd.decode("utf-8"), salt.decode("utf-8")
 
 
-def check_password(passwd, hashed_passwd, stored_salt):
-    """
-    Takes the user-input password, and the hashed password and salt
-    stored in the DB and checks if the password in the DB matches the
-    user-input password.
-    """
+# Checks passwords on worker processes. Set `LOGIN_HASH_WORKERS` to
+# change how many, from the default of one per core.
+password_pool = PasswordPool(int(os.environ.get("LOGIN_HASH_WORKERS") or 0) or None)
 
-    # Encode the password, hashed password, and the salt to bytes
-    passwd_bytes = passwd.encode("utf-8")
-    hashed_passwd_bytes = hashed_passwd.encode("utf-8")
-    salt_bytes = stored_salt.encode("utf-8")
 
-    # Compute a hashed version of the provided password using the stored salt
-    computed_hash = bcrypt.hashpw(passwd_bytes, salt_bytes)
-
-    # Check if the computed hash matches the stored hash
-    return computed_hash == hashed_passwd_bytes
+async def check_password(passwd, hashed_passwd):
+    """
+    Takes the user-input password and the hashed password stored in
+    the DB, and checks if they match. The salt is part of the hashed
+    password, and `bcrypt.checkpw` compares the hashes in constant
+    time. Raises `PoolBusy` if too many passwords are being checked.
+    """
+    return await password_pool.checkpw_async(
+        passwd.encode("utf-8"), hashed_passwd.encode("utf-8")
+    )
 
 
-def check_login(username, password):
+async def check_login(username, password):
+    """
+    Returns the user, if the password is theirs. This is an async
+    function, so that the `hd.task` running it doesn't hold one of
+    Hyperdiv's task threads while the password is checked. Looking up
+    the user is quick, since the user store is indexed.
+    """
     user = get_user_by_username(username)
     if not user:
         return None
-    if check_password(password, user["password"], user["salt"]):
+    if await check_password(password, user["password"]):
+        if hash_cost(user["password"]) != password_cost:
+            user = await rehash_password(user, password)
+        return user
+
+
+async def rehash_password(user, password):
+    """
+    Hashes the user's password again at `password_cost`, now that we
+    know it, and returns the updated user. This way, changing the cost
+    updates each user's hash at their next login.
+    """
+    salt = bcrypt.gensalt(password_cost)
+    try:
+        hashed_passwd = await password_pool.hashpw_async(
+            password.encode("utf-8"), salt
+        )
+    except PoolBusy:
+        # Try again at the next login.
         return user
+    user_store.update(
+        user["username"],
+        password=hashed_passwd.decode("utf-8"),
+        salt=salt.decode("utf-8"),
+    )
+    return user_store.get_by_username(user["username"])
@@ -0,0 +1,210 @@
+import re
+import threading
+from textwrap import dedent
+from functools import lru_cache
+from collections import OrderedDict
+import hyperdiv as hd
+from hyperdiv.prop_types import HyperdivType
+from hyperdiv.components.markdown import mistune_markdown, mistune_renderer
+
+# Renders markdown documents a block at a time, caching each block's
+# HTML, so that editing a large document only re-renders the blocks
+# that changed. The note-taking app has a copy of this module.
+#
+# Blocks are the parts of a document between blank lines that render
+# on their own; see `split_blocks`.
+
+# Blank lines, which separate blocks. They are captured, so blocks
+# joined back together keep their blank lines, like in code blocks.
+blank_lines_re = re.compile(r"(\n(?:[ \t]*\n)+)")
+# The opening or closing line of a fenced code block.
+fence_re = re.compile(r"^ {0,3}(`{3,}|~{3,})", re.MULTILINE)
+# A link reference definition, like `[label]: https://...`, or an
+# abbreviation definition, like `*[HTML]: Hypertext Markup Language`.
+definition_re = re.compile(r"^ {0,3}\*?\[[^\]]+\]:", re.MULTILINE)
+abbreviation_re = re.compile(r"^ {0,3}\*\[[^\]]+\]:", re.MULTILINE)
+list_item_re = re.compile(r" {0,3}(?:[-+*]|\d{1,9}[.)])(?:[ \t]|$)")
+
+
+def update_fence(fence, text):
+    """
+    Returns the fence of the code block left open at the end of
+    `text`, given the fence left open before it, or None.
+    """
+    for match in fence_re.finditer(text):
+        marker = match.group(1)
+        if fence is None:
+            fence = marker
+        elif marker[0] == fence[0] and len(marker) >= len(fence):
+            fence = None
+    return fence
+
+
+def render_markdown(text):
+    """Renders markdown to HTML with the parser of `hd.markdown`."""
+    # Mistune's abbreviation plugin leaves the abbreviations it parsed
+    # behind in the parser, after which documents that use them
+    # without defining them fail to render. So documents that define
+    # abbreviations get a parser of their own.
+    if "*[" in text and abbreviation_re.search(text):
+        return mistune_renderer()(text).strip()
+    return mistune_markdown(text).strip()
+
+
+def split_blocks(text):
+    """
+    Splits a markdown document into blocks at blank lines, such that
+    each block renders the same on its own as it does in the document.
+    Fenced code blocks, indented continuations, and lists with blank
+    lines between their items are kept in one block.
+    """
+    # Link references and abbreviations can be used anywhere in the
+    # document, so a document with their definitions is rendered whole.
+    if "]:" in text and definition_re.search(text):
+        return (text,)
+
+    blocks = []
+    fence = None
+    previous_is_list = False
+    parts = blank_lines_re.split(text)
+    # The parts alternate between chunks and the blank lines after them.
+    for chunk, blank_lines in zip(parts[::2], parts[1::2] + [""]):
+        is_list = list_item_re.match(chunk) is not None
+        if blocks and (
+            fence is not None
+            or chunk[:1] in (" ", "\t")
+            or (is_list and previous_is_list)
+        ):
+            blocks[-1] += separator + chunk
+        else:
+            blocks.append(chunk)
+            previous_is_list = is_list
+        separator = blank_lines
+        if "``" in chunk or "~~" in chunk:
+            fence = update_fence(fence, chunk)
+    return tuple(blocks)
+
+
+class RenderCache:
+    """
+    An LRU cache of rendered markdown, keyed by the markdown, which
+    Python looks up by its hash. It holds up to `max_size` characters
+    of HTML.
+
+    Markdown with several blocks is rendered a block at a time, each
+    block going through the cache, so when a cached document changes,
+    only its changed blocks are rendered again.
+    """
+
+    def __init__(self, max_size=32_000_000):
+        self.max_size = max_size
+        self.size = 0
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, text):
+        with self.lock:
+            html = self.entries.get(text)
+            if html is not None:
+                self.entries.move_to_end(text)
+            return html
+
+    def put(self, text, html):
+        with self.lock:
+            if text not in self.entries:
+                self.entries[text] = html
+                self.size += len(html)
+                while self.size > self.max_size and len(self.entries) > 1:
+                    _, evicted_html = self.entries.popitem(last=False)
+                    self.size -= len(evicted_html)
+
+    def render(self, text):
+        html = self.get(text)
+        if html is None:
+            blocks = split_blocks(text)
+            if len(blocks) == 1:
+                html = render_markdown(text)
+            else:
+                html = "\n".join(self.render(block) for block in blocks)
+            self.put(text, html)
+        return html
+
+
+render_cache = RenderCache()
+
+
+class CachedMarkdownDef(HyperdivType):
+    """
+    Like `hd.markdown`'s content type, but rendered through
+    `render_cache`. Like `hd.markdown`, it dedents the markdown first,
+    unless `dedented` says that was done already.
+    """
+
+    def __init__(self, dedented=False):
+        self.dedented = dedented
+
+    def parse(self, value):
+        return render_cache.render(value if self.dedented else dedent(value))
+
+    def __repr__(self):
+        return "CachedMarkdown"
+
+
+CachedMarkdown = CachedMarkdownDef()
+DedentedMarkdown = CachedMarkdownDef(dedented=True)
+
+
+class cached_markdown(hd.markdown):
+    """An `hd.markdown` whose rendered HTML is cached in `render_cache`."""
+
+    content = hd.Prop(CachedMarkdown, "")
+
+
+class markdown_section(cached_markdown):
+    """
+    A section of a document rendered by `markdown_document`, which
+    dedents the whole document. Dedenting the section again could
+    turn an indented code block into a paragraph.
+    """
+
+    content = hd.Prop(DedentedMarkdown, "")
+
+
+# Documents are re-rendered whenever anything else on the page
+# changes, so the last few splits are cached.
+@lru_cache(maxsize=8)
+def split_sections(text, section_size):
+    """
+    Dedents a document, like `hd.markdown` does, and splits it into
+    sections of about `section_size` blocks. Sections end after blocks whose hash is a multiple of
+    `section_size`, so adding or removing a block only changes the
+    section it is in.
+    """
+    sections = []
+    section = []
+    for block in split_blocks(dedent(text)):
+        section.append(block)
+        if hash(block) % section_size == 0:
+            sections.append("\n\n".join(section))
+            section = []
+    if section:
+        sections.append("\n\n".join(section))
+    return tuple(sections)
+
+
+def markdown_document(text, gap=1.5, section_size=64, **kwargs):
+    """
+    Renders a markdown document like `hd.markdown(text)`, but split
+    into sections, each in a component keyed by its content. When the
+    document changes, only the changed sections are rendered and sent
+    to the browser, and within them, only the changed blocks are
+    rendered.
+    """
+    with hd.box(gap=gap, **kwargs) as box:
+        occurrences = {}
+        for section in split_sections(text, section_size):
+            n = occurrences.get(section, 0)
+            occurrences[section] = n + 1
+            with hd.scope(f"{hash(section)}:{n}"):
+                markdown_section(section, gap=gap)
+    return box
@@ -1,6 +1,7 @@
 import os
 import sys
 import hyperdiv as hd
+from markdown_cache import markdown_document
 
 if len(sys.argv) <= 1:
     print(f"Usage: python {sys.argv[0]} <file>")
@@ -63,7 +64,7 @@ def main():
                         save(state.contents)
 
             with hd.box(width="50%", vertical_scroll=True):
-                hd.markdown(ta.value)
+                markdown_document(ta.value)
 
 
 hd.run(main)
@@ -0,0 +1,420 @@
+"""
+Benchmarks for the note-taking app's database layer. Each benchmark
+runs against a fresh database in a temporary directory, never the
+app's `notes.db`.
+
+Usage: python bench.py <benchmark> [options]
+
+Run `python bench.py --help` for the list of benchmarks.
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+
+# Point the app at a scratch database before importing it.
+os.environ["NOTES_DB"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from hyperdiv.sqlite import sqlite  # noqa: E402
+from notes import notes_db  # noqa: E402
+from notes.note_list import NoteList  # noqa: E402
+from notes.change_feed import change_feed  # noqa: E402
+from notes.autosave import Autosaver  # noqa: E402
+from notes.markdown_cache import RenderCache, split_sections  # noqa: E402
+from hyperdiv.components.markdown import mistune_markdown  # noqa: E402
+
+words = (
+    "the quick brown fox jumps over lazy dog note meeting idea project "
+    "plan todo review draft release bug fix design sqlite python server "
+    "client latency cache index query search render markdown"
+).split()
+
+
+def random_body(rng, paragraphs=5):
+    return "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(20, 60)))
+        for _ in range(paragraphs)
+    )
+
+
+def create_notes(n, seed=0):
+    """Creates `n` notes with random bodies and returns their ids."""
+    rng = random.Random(seed)
+    note_ids = []
+    for _ in range(n):
+        note_id = notes_db.create_empty_note()
+        body = f"# Note {len(note_ids)}\n\n{random_body(rng)}"
+        notes_db.save_note(note_id, f"Note {len(note_ids)}", body)
+        note_ids.append(note_id)
+    return note_ids
+
+
+def insert_notes(n, seed=0, batch=5000):
+    """
+    Like `create_notes`, but inserts the notes in large transactions,
+    for benchmarks that need a big corpus quickly.
+    """
+    rng = random.Random(seed)
+    now = int(time.time())
+    for first in range(0, n, batch):
+        rows = [
+            (
+                uuid.uuid4().hex,
+                f"Note {i}",
+                f"# Note {i}\n\n{random_body(rng)}",
+                now - n + i,
+            )
+            for i in range(first, min(n, first + batch))
+        ]
+        with notes_db.pool.transaction() as (_, cursor):
+            cursor.executemany(
+                "insert into Note (note_id, note_title, note_body, ts) "
+                "values (?, ?, ?, ?)",
+                rows,
+            )
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def report(name, latencies):
+    print(
+        f"{name:<24} calls={len(latencies):<7} "
+        f"avg={sum(latencies) / len(latencies) * 1000:.3f}ms "
+        f"p95={percentile(latencies, 0.95) * 1000:.3f}ms"
+    )
+
+
+def run_sessions(fn, sessions, calls):
+    """
+    Runs `fn(rng)` `calls` times on each of `sessions` concurrent
+    threads, and returns the latency of every call.
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def session(i):
+        rng = random.Random(i)
+        local = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            fn(rng)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def bench_pool(args):
+    """Per-call latency of pooled connections vs. opening one per call."""
+    note_ids = create_notes(args.notes)
+
+    def read_per_call(note_id):
+        # The app's queries before pooling: a new connection per call.
+        with sqlite(notes_db.db) as (_, cursor):
+            cursor.execute(
+                "select note_body, note_title, ts from Note where note_id = ?",
+                (note_id,),
+            )
+            return cursor.fetchall()
+
+    def list_per_call():
+        with sqlite(notes_db.db) as (_, cursor):
+            cursor.execute("select note_id, note_title, ts from Note order by ts desc")
+            return cursor.fetchall()
+
+    print(f"{args.notes} notes, {args.sessions} concurrent sessions")
+    for name, fn in [
+        ("read, per call", lambda rng: read_per_call(rng.choice(note_ids))),
+        ("read, pooled", lambda rng: notes_db.read_note(rng.choice(note_ids))),
+        ("list, per call", lambda rng: list_per_call()),
+        ("list, pooled", lambda rng: notes_db.get_notes()),
+    ]:
+        report(name, run_sessions(fn, args.sessions, args.calls))
+
+
+def bench_search(args):
+    """Latency of full-text search over a generated corpus."""
+    start = time.perf_counter()
+    insert_notes(args.notes)
+    print(f"Indexed {args.notes} notes in {time.perf_counter() - start:.1f}s")
+
+    queries = [
+        # Matches most notes, so ranking has the most work to do.
+        "markdown",
+        "sqlite cache",
+        "late",
+        "release bug fix",
+        # Matches no notes.
+        "nonexistent",
+    ]
+    for query in queries:
+        report(
+            f"search {query!r}",
+            run_sessions(lambda rng: notes_db.search_notes(query), 1, args.calls),
+        )
+
+
+def bench_changes(args):
+    """
+    The cost of updating the sidebar's list after a save: re-reading
+    the notes vs. applying the save from the change feed.
+    """
+    note_ids = create_notes(args.notes)
+    note_list = NoteList(page_size=100)
+    while note_list.has_more:
+        note_list.load_page(notes_db.get_notes)
+
+    def save(rng):
+        notes_db.save_note(rng.choice(note_ids), "Title", "Body")
+
+    # Only the refreshes are timed, not the saves.
+    reread = []
+
+    def save_and_reread(rng):
+        save(rng)
+        start = time.perf_counter()
+        notes_db.get_notes()
+        reread.append(time.perf_counter() - start)
+
+    run_sessions(save_and_reread, 1, args.calls)
+    report("re-read list", reread)
+
+    applied = []
+
+    def timed_apply(kind, note):
+        start = time.perf_counter()
+        note_list.apply(kind, note)
+        applied.append(time.perf_counter() - start)
+
+    change_feed.subscribe(timed_apply)
+    run_sessions(save, 1, args.calls)
+    change_feed.unsubscribe(timed_apply)
+    report("apply change", applied)
+
+
+def bench_autosave(args):
+    """
+    What an edit to a large note costs the render thread: saving it
+    in place, as the Save button did, vs. scheduling an autosave.
+    """
+    rng = random.Random(0)
+    note_id = create_notes(1)[0]
+    body = ""
+    while len(body) < args.size:
+        body += random_body(rng) + "\n\n"
+    # Each edit appends to the end, the slowest case to compare.
+    edits = [f"{body}Edit {i}" for i in range(args.calls)]
+
+    def save(i):
+        notes_db.save_note(note_id, f"Edit {i}", edits[i])
+
+    saves = []
+    for i in range(args.calls):
+        start = time.perf_counter()
+        save(i)
+        saves.append(time.perf_counter() - start)
+    report("save in place", saves)
+
+    autosaver = Autosaver(lambda note_id, note_body: None, delay=0.01)
+    scheduled = []
+    previous = edits[0]
+    for edit in edits:
+        start = time.perf_counter()
+        # The editor compares the new value with the last one.
+        if edit != previous:
+            autosaver.schedule(note_id, edit)
+        scheduled.append(time.perf_counter() - start)
+        previous = edit
+    report("schedule autosave", scheduled)
+
+
+def markdown_document(rng, size):
+    """A markdown document of about `size` characters."""
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        part = [
+            f"## Section {i}\n\n{random_body(rng, 1)}",
+            "\n".join(f"- {rng.choice(words)} {rng.choice(words)}" for _ in range(5)),
+            f"```py\ndef f{i}():\n\n    return {i}\n```",
+            f"> {random_body(rng, 1)}",
+        ][i % 4]
+        parts.append(part)
+        length += len(part) + 2
+        i += 1
+    return parts
+
+
+def bench_markdown(args):
+    """
+    Re-rendering a large markdown document after an edit: rendering it
+    whole, as `hd.markdown` does for every new value, vs. rendering it
+    by sections and blocks through the render cache, as
+    `markdown_document` does.
+    """
+    rng = random.Random(0)
+    parts = markdown_document(rng, args.size)
+    print(f"{len(parts)} blocks, {sum(map(len, parts)) // 1024}KB")
+
+    # Each edit changes one paragraph in the middle.
+    edits = []
+    for i in range(args.calls):
+        edited = list(parts)
+        edited[len(parts) // 2] = f"An edit, number {i}."
+        edits.append("\n\n".join(edited))
+
+    whole = []
+    for edit in edits:
+        start = time.perf_counter()
+        mistune_markdown(edit)
+        whole.append(time.perf_counter() - start)
+    report("render whole", whole)
+
+    cache = RenderCache()
+
+    def render_sections(document):
+        for section in split_sections(document, 64):
+            cache.render(section)
+
+    start = time.perf_counter()
+    render_sections(edits[0])
+    report("cached, cold", [time.perf_counter() - start])
+
+    cached = []
+    for edit in edits:
+        start = time.perf_counter()
+        render_sections(edit)
+        cached.append(time.perf_counter() - start)
+    report("cached, after an edit", cached)
+
+    start = time.perf_counter()
+    render_sections(edits[-1])
+    report("cached, unchanged", [time.perf_counter() - start])
+
+
+def bench_revisions(args):
+    """
+    Storage and rebuild time of a note's revisions, for a note edited
+    `--calls` times, a few words at a time.
+    """
+    rng = random.Random(0)
+    note_id = create_notes(1)[0]
+    body = ""
+    while len(body) < args.size:
+        body += random_body(rng) + "\n\n"
+
+    saves = []
+    full_size = 0
+    for i in range(args.calls):
+        at = rng.randrange(len(body))
+        body = body[:at] + f" edit {i} " + body[at + rng.randrange(10) :]
+        full_size += len(body.encode("utf-8"))
+        start = time.perf_counter()
+        notes_db.save_note(note_id, "Title", body)
+        saves.append(time.perf_counter() - start)
+    report("save", saves)
+
+    with notes_db.pool.connection() as (_, cursor):
+        cursor.execute(
+            "select count(*) as n, sum(length(data)) as size from Revision"
+        )
+        stored = cursor.fetchone()
+    print(
+        f"{stored['n']} revisions of a {len(body) // 1024}KB note: "
+        f"{stored['size'] / 1024 / 1024:.2f}MB stored, "
+        f"{full_size / 1024 / 1024:.2f}MB as full copies"
+    )
+
+    revisions = [rng.randrange(stored["n"]) for _ in range(200)]
+    report(
+        "rebuild",
+        run_sessions(
+            lambda rng: notes_db.read_revision(note_id, rng.choice(revisions)),
+            1,
+            200,
+        ),
+    )
+
+
+def bench_large(args):
+    """
+    Opening a large note: reading its whole body, as the note page
+    did, vs. reading its inline part and then its tail a page at a
+    time. Also times listing the notes, which only reads the NoteList
+    index, however large the bodies are.
+    """
+    insert_notes(args.notes)
+    rng = random.Random(0)
+    note_id = notes_db.create_empty_note()
+    body = ""
+    while len(body) < args.size:
+        body += random_body(rng) + "\n\n"
+    notes_db.save_note(note_id, "Large", body)
+    print(f"{args.notes} notes and a {len(body) // 1024 // 1024}MB note")
+
+    def read_tail():
+        offset = 0
+        while offset < more:
+            _, offset = notes_db.read_note_tail(note_id, offset)
+
+    more = notes_db.read_note(note_id)["more"]
+    for name, fn in [
+        ("read whole body", lambda rng: notes_db.read_full_note(note_id)),
+        ("read inline part", lambda rng: notes_db.read_note(note_id)),
+        ("read a tail page", lambda rng: notes_db.read_note_tail(note_id, 0)),
+        ("read every tail page", lambda rng: read_tail()),
+        ("list notes", lambda rng: notes_db.get_notes(limit=100)),
+    ]:
+        report(name, run_sessions(fn, 1, args.calls))
+
+    with notes_db.pool.connection() as (_, cursor):
+        cursor.execute(
+            "explain query plan select note_id, note_title, ts from Note "
+            "order by ts desc, note_id desc limit 100"
+        )
+        print("list query plan:", cursor.fetchone()["detail"])
+
+
+benchmarks = {
+    "large": bench_large,
+    "revisions": bench_revisions,
+    "markdown": bench_markdown,
+    "autosave": bench_autosave,
+    "changes": bench_changes,
+    "pool": bench_pool,
+    "search": bench_search,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the notes database.")
+    parser.add_argument("benchmark", choices=sorted(benchmarks))
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument(
+        "--size", type=int, default=4_000_000, help="Note size, in characters."
+    )
+    args = parser.parse_args()
+
+    notes_db.migrate_notes_db()
+    benchmarks[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Imports notes into the app's database, and exports them out of it.
+
+Usage:
+
+python cli.py import <path>  Imports the markdown files (.md,
+                             .markdown, .txt) in a directory, tar or
+                             zip archive, as new notes.
+
+python cli.py export <path>  Writes every note to a markdown file in
+                             a directory, or a .tar, .tar.gz, .tgz or
+                             .zip archive.
+
+The app's sidebar shows imported notes after the app is restarted.
+"""
+
+import sys
+import time
+import argparse
+from notes.notes_db import migrate_notes_db
+from notes.bulk import import_notes, export_notes
+
+
+def progress(verb):
+    start = time.perf_counter()
+
+    def report(count):
+        elapsed = time.perf_counter() - start
+        print(f"\r{verb} {count} notes in {elapsed:.1f}s", end="", flush=True)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export notes.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path")
+    parser.add_argument(
+        "--batch", type=int, default=5000, help="Notes inserted per transaction."
+    )
+    args = parser.parse_args()
+
+    migrate_notes_db()
+    if args.command == "import":
+        report = progress("Imported")
+        count = import_notes(args.path, args.batch, on_batch=report)
+    else:
+        report = progress("Exported")
+
+        def on_note(count):
+            if count % 1000 == 0:
+                report(count)
+
+        count = export_notes(args.path, on_note)
+        report(count)
+    print()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Checks that `markdown_document` renders documents the same as
+`hd.markdown` does, for documents that splitting into sections and
+blocks could get wrong: indented documents, which `hd.markdown`
+dedents, link and abbreviation definitions, which apply to the whole
+document, and blocks with blank lines inside them.
+
+Usage: python markdown_check.py
+"""
+
+import sys
+from textwrap import dedent
+from hyperdiv.components.markdown import mistune_renderer
+from notes.markdown_cache import split_sections, DedentedMarkdown
+
+documents = {
+    "indented paragraph": "    hello\n    world",
+    "indented document": """
+        # A heading
+
+        A paragraph.
+
+            An indented code block.
+        """,
+    "link definition": "A [link][home].\n\nAnother paragraph.\n\n[home]: /",
+    "code with blank lines": "Code:\n\n```py\na = 1\n\n\n\nb = 2\n```\n\nAfter.",
+    "list with blank lines": "- one\n\n- two\n\n  continued\n\n- three\n\nAfter.",
+    "table and quote": "| a | b |\n|---|---|\n| 1 | 2 |\n\n> A quote.\n\nAfter.",
+    "abbreviation": "Some HTML.\n\nMore HTML.\n\n*[HTML]: Hypertext Markup Language",
+}
+
+
+def parse_markdown(text):
+    """
+    Renders `text` like `hd.markdown` does, but with a parser of its
+    own, which documents with abbreviations can't break for the
+    others. See `render_markdown`.
+    """
+    return mistune_renderer()(dedent(text)).strip()
+
+
+def render_document(text, section_size):
+    """Renders `text` the way `markdown_document` does, as one string."""
+    sections = split_sections(text, section_size)
+    return "\n".join(DedentedMarkdown.parse(section) for section in sections)
+
+
+def main():
+    errors = []
+    for name, text in documents.items():
+        expected = parse_markdown(text)
+        # With sections of one block, every block is a section.
+        for section_size in (1, 64):
+            if render_document(text, section_size) != expected:
+                errors.append(f"{name}, sections of {section_size} blocks")
+
+    # A document using a word that another document defined as an
+    # abbreviation.
+    try:
+        render_document("No abbreviations in this HTML.", 64)
+    except Exception as e:
+        errors.append(f"abbreviation defined by another document: {e!r}")
+    print(f"Checked {len(documents)} documents.")
+    for error in errors:
+        print("ERROR:", error)
+    return not errors
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
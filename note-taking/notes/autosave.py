@@ -0,0 +1,157 @@
+import time
+import hashlib
+import threading
+import contextlib
+from collections import namedtuple
+import hyperdiv as hd
+
+# An edit waiting to be saved. `on_saved` is called once it is saved
+# (or found to be unchanged). `in_session` runs a block in the
+# Hyperdiv session that made the edit; see `session_context`.
+Edit = namedtuple("Edit", "due note_body on_saved in_session")
+
+
+def session_context():
+    """
+    Returns a function that makes a context manager, in which the
+    current Hyperdiv session's state can be written from another
+    thread, later on. Saving a note updates state, like the sidebar's
+    note list, through the change feed, and Hyperdiv only allows that
+    inside a frame of a session. Outside of a session, the context
+    manager does nothing.
+
+    `AppRunnerFrame` isn't public API. `hd.task` does the same thing,
+    running its function in a `task_frame()` of the frame that started
+    it, but a task can only start during a render, while autosaves run
+    later, on the autosaver's thread. If a Hyperdiv upgrade changes
+    these internals, this function is what needs updating. The app's
+    only other use of Hyperdiv internals is in `markdown_cache.py`,
+    which renders with the markdown parser behind `hd.markdown`.
+    """
+    from hyperdiv.frame import AppRunnerFrame
+
+    try:
+        frame = AppRunnerFrame.current()
+    except RuntimeError:
+        return contextlib.nullcontext
+    return frame.task_frame
+
+
+def content_hash(note_body):
+    return hashlib.blake2b(note_body.encode("utf-8"), digest_size=16).digest()
+
+
+class Autosaver:
+    """
+    Saves notes in the background while they are edited.
+
+    `schedule()` records a note's latest content and returns right
+    away. The content is written `delay` seconds after the last edit,
+    so a burst of typing results in a single write. Writes happen on
+    a worker thread, one at a time, with `save(note_id, note_body)`,
+    and are skipped when the content hashes the same as what was last
+    saved or read.
+    """
+
+    def __init__(self, save, delay=1.0):
+        self.save = save
+        self.delay = delay
+        self.cond = threading.Condition()
+        # Held while writing, so reads see a note either before or
+        # after a write, along with the matching pending edit.
+        self.write_lock = threading.Lock()
+        # Maps each note_id to its unsaved `Edit`. An edit stays here
+        # until it is written, so `read()` sees it meanwhile.
+        self.pending = {}
+        # Maps each note_id to the hash of its content in the DB.
+        self.saved_hashes = {}
+        self.thread = None
+
+    def schedule(self, note_id, note_body, on_saved=None):
+        with self.cond:
+            self.pending[note_id] = Edit(
+                time.monotonic() + self.delay,
+                note_body,
+                on_saved,
+                session_context(),
+            )
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name="autosave", daemon=True
+                )
+                self.thread.start()
+            self.cond.notify()
+
+    def save_now(self, note_id):
+        """Writes the note's pending edit, if any, without waiting."""
+        with self.cond:
+            edit = self.pending.get(note_id)
+            if edit is not None:
+                self.pending[note_id] = edit._replace(due=0)
+                self.cond.notify()
+
+    def read(self, note_id, read_note):
+        """
+        Reads a note with `read_note(note_id)`, with its unsaved edit
+        applied, if it has one. The note may have only part of its
+        body, if `more` is set, in which case its hash isn't recorded.
+        """
+        with self.write_lock:
+            note = read_note(note_id)
+            if note is None:
+                return None
+            with self.cond:
+                if not note.get("more"):
+                    self.saved_hashes[note_id] = content_hash(note["note_body"])
+                edit = self.pending.get(note_id)
+        if edit is not None:
+            note = dict(note, note_body=edit.note_body, more=0)
+        return note
+
+    def next_edit(self):
+        """Waits for an edit to be due, and returns it with its note_id."""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                first = min(
+                    self.pending.items(), key=lambda item: item[1].due, default=None
+                )
+                if first is None:
+                    self.cond.wait()
+                elif first[1].due <= now:
+                    return first
+                else:
+                    self.cond.wait(first[1].due - now)
+
+    def run(self):
+        while True:
+            note_id, edit = self.next_edit()
+            digest = content_hash(edit.note_body)
+            with self.write_lock:
+                if digest != self.saved_hashes.get(note_id):
+                    try:
+                        with edit.in_session():
+                            self.save(note_id, edit.note_body)
+                    except Exception as e:
+                        hd.logger.warn(f"Autosave failed for {note_id}: {e}")
+                        # Try again after another delay.
+                        with self.cond:
+                            if self.pending.get(note_id) is edit:
+                                self.pending[note_id] = edit._replace(
+                                    due=time.monotonic() + self.delay
+                                )
+                        continue
+                with self.cond:
+                    self.saved_hashes[note_id] = digest
+                    # Unless the note was edited again meanwhile, it
+                    # is saved.
+                    if self.pending.get(note_id) is edit:
+                        del self.pending[note_id]
+            # If the callback fails, like when its session is gone, the
+            # note is still saved, and the thread must keep running.
+            if edit.on_saved:
+                try:
+                    with edit.in_session():
+                        edit.on_saved()
+                except Exception as e:
+                    hd.logger.warn(f"Autosave callback failed for {note_id}: {e}")
@@ -0,0 +1,228 @@
+import io
+import gzip
+import os
+import re
+import time
+import uuid
+import zipfile
+import tarfile
+import datetime
+import threading
+from queue import Queue
+from .notes_db import pool, split_body, extract_title
+
+# Moves notes into and out of the database in bulk. Imports insert
+# the notes `batch_size` at a time with `executemany`, each batch in
+# one transaction, and exports read the notes through a cursor, one at
+# a time, so neither holds the whole corpus in memory.
+
+# The files imported as notes.
+note_extensions = (".md", ".markdown", ".txt")
+
+
+def is_note_file(name):
+    return name.lower().endswith(note_extensions)
+
+
+def decode(data):
+    return data.decode("utf-8", errors="replace")
+
+
+def read_directory(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if is_note_file(name):
+                file_path = os.path.join(root, name)
+                with open(file_path, "rb") as f:
+                    yield decode(f.read()), int(os.path.getmtime(file_path))
+
+
+def read_tar(path):
+    # "r|*" reads the archive as a stream, one member at a time, and
+    # detects its compression.
+    with tarfile.open(path, "r|*") as tar:
+        for member in tar:
+            if member.isfile() and is_note_file(member.name):
+                yield decode(tar.extractfile(member).read()), int(member.mtime)
+
+
+def read_zip(path):
+    with zipfile.ZipFile(path) as z:
+        for info in z.infolist():
+            if not info.is_dir() and is_note_file(info.filename):
+                ts = datetime.datetime(*info.date_time).timestamp()
+                yield decode(z.read(info)), int(ts)
+
+
+def read_notes(path):
+    """
+    Yields the `(note_body, ts)` of each note file in `path`, which
+    can be a directory, a tar archive (optionally compressed), or a
+    zip archive. A note's timestamp is its file's modification time.
+    """
+    if os.path.isdir(path):
+        return read_directory(path)
+    if zipfile.is_zipfile(path):
+        return read_zip(path)
+    if tarfile.is_tarfile(path):
+        return read_tar(path)
+    raise ValueError(f"{path} is not a directory, tar or zip archive.")
+
+
+def insert_notes(rows):
+    """
+    Inserts a batch of notes in one transaction. The NoteFtsInsert
+    trigger indexes them for search as they are inserted.
+    """
+    notes = []
+    tails = []
+    for note_id, note_title, note_body, ts in rows:
+        head, tail = split_body(note_body)
+        notes.append((note_id, note_title, head, ts))
+        if tail is not None:
+            tails.append((note_id, tail))
+
+    with pool.transaction() as (_, cursor):
+        cursor.executemany(
+            """
+            insert into Note (note_id, note_title, note_body, ts)
+            values (?, ?, ?, ?)
+            """,
+            notes,
+        )
+        cursor.executemany(
+            "insert into NoteBlob (note_id, data) values (?, ?)", tails
+        )
+
+
+def read_batches(path, batch_size, batches):
+    """Puts batches of rows to insert on the `batches` queue."""
+    try:
+        rows = []
+        for note_body, ts in read_notes(path):
+            rows.append((uuid.uuid4().hex, extract_title(note_body), note_body, ts))
+            if len(rows) == batch_size:
+                batches.put(rows)
+                rows = []
+        if rows:
+            batches.put(rows)
+        batches.put(None)
+    except Exception as e:
+        batches.put(e)
+
+
+def import_notes(path, batch_size=5000, on_batch=None):
+    """
+    Imports the notes in `path` (see `read_notes`), and returns how
+    many were imported. `on_batch(count)` is called after each batch
+    with the number of notes imported so far.
+
+    The files are read on a separate thread, so reading the next
+    batch overlaps with inserting the last one.
+    """
+    # Two batches can wait to be inserted, bounding memory use.
+    batches = Queue(maxsize=2)
+    reader = threading.Thread(
+        target=read_batches, args=(path, batch_size, batches), daemon=True
+    )
+    reader.start()
+
+    count = 0
+    while True:
+        rows = batches.get()
+        if rows is None:
+            break
+        if isinstance(rows, Exception):
+            raise rows
+        insert_notes(rows)
+        count += len(rows)
+        if on_batch:
+            on_batch(count)
+    return count
+
+
+def iter_notes():
+    """Yields every note, with its body, newest first."""
+    with pool.connection() as (_, cursor):
+        cursor.execute(
+            """
+            select
+                note_id,
+                note_title,
+                Note.note_body || coalesce(cast(NoteBlob.data as text), '')
+                    as note_body,
+                ts
+            from Note left join NoteBlob using (note_id)
+            order by ts desc, note_id desc
+            """
+        )
+        # Iterating the cursor fetches a row at a time.
+        yield from cursor
+
+
+def file_name(note):
+    """A file name for the note, from its title and id."""
+    slug = re.sub(r"[^a-z0-9]+", "-", note["note_title"].lower()).strip("-")
+    return f"{slug[:60] or 'note'}-{note['note_id'][:8]}.md"
+
+
+def export_directory(path, notes):
+    os.makedirs(path, exist_ok=True)
+    for note in notes:
+        file_path = os.path.join(path, file_name(note))
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(note["note_body"])
+        os.utime(file_path, (note["ts"], note["ts"]))
+        yield
+
+
+def export_tar(path, notes):
+    # tarfile compresses at gzip's slowest level, which is several
+    # times slower and barely smaller, so compress the stream here.
+    if path.endswith((".tar.gz", ".tgz")):
+        f = gzip.open(path, "wb", compresslevel=6)
+    else:
+        f = open(path, "wb")
+    with f, tarfile.open(fileobj=f, mode="w|") as tar:
+        for note in notes:
+            data = note["note_body"].encode("utf-8")
+            info = tarfile.TarInfo(file_name(note))
+            info.size = len(data)
+            info.mtime = note["ts"]
+            tar.addfile(info, io.BytesIO(data))
+            yield
+
+
+def export_zip(path, notes):
+    with zipfile.ZipFile(path, "w") as z:
+        for note in notes:
+            # Zip timestamps start in 1980.
+            info = zipfile.ZipInfo(
+                file_name(note), time.localtime(max(note["ts"], 315532800))[:6]
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            z.writestr(info, note["note_body"])
+            yield
+
+
+def export_notes(path, on_note=None):
+    """
+    Writes every note to `path`, as a markdown file in a directory, or
+    in a tar or zip archive if `path` ends in `.tar`, `.tar.gz`,
+    `.tgz` or `.zip`. Returns how many notes were exported.
+    `on_note(count)` is called after each note.
+    """
+    if path.endswith(".zip"):
+        export = export_zip
+    elif path.endswith((".tar", ".tar.gz", ".tgz")):
+        export = export_tar
+    else:
+        export = export_directory
+
+    count = 0
+    for _ in export(path, iter_notes()):
+        count += 1
+        if on_note:
+            on_note(count)
+    return count
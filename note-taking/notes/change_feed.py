@@ -0,0 +1,41 @@
+import threading
+import hyperdiv as hd
+
+
+class ChangeFeed:
+    """
+    Tells subscribers about the notes written by `notes_db`, so they
+    can update what they show without re-reading the notes.
+
+    After each write, every subscriber is called with `(kind, note)`,
+    where `kind` is "inserted", "updated" or "deleted", and `note` is
+    the note's `note_id`, `note_title` and `ts`. Deleted notes only
+    have a `note_id`.
+
+    Subscribers are called on the thread that did the write, after it
+    was committed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = ()
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers = self.subscribers + (callback,)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers = tuple(s for s in self.subscribers if s != callback)
+
+    def emit(self, kind, note):
+        for callback in self.subscribers:
+            # The write is already committed, so a failing subscriber
+            # shouldn't fail it.
+            try:
+                callback(kind, note)
+            except Exception as e:
+                hd.logger.warn(f"Change feed subscriber failed: {e}")
+
+
+change_feed = ChangeFeed()
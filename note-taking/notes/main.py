@@ -1,21 +1,35 @@
+import asyncio
 import datetime
 import hyperdiv as hd
 from .notes_db import (
     create_empty_note,
     read_note,
+    read_full_note,
+    read_note_tail,
     get_notes,
     save_note,
     delete_note,
+    search_notes,
+    get_revisions,
+    read_revision,
+    migrator,
+    extract_title,
 )
+from .change_feed import change_feed
+from .note_list import NoteList
+from .autosave import Autosaver
+from .markdown_cache import markdown_document
 
 router = hd.router()
 
 
-def extract_title(note_body):
-    if not note_body:
-        return ""
-    else:
-        return note_body.split("\n", 1)[0].lstrip(" #")
+def save_edit(note_id, note_body):
+    save_note(note_id, extract_title(note_body), note_body)
+
+
+# Saves notes in the background while they are edited. See
+# `autosave.py`.
+autosaver = Autosaver(save_edit, delay=1.0)
 
 
 def format_timestamp(ts):
@@ -25,25 +39,84 @@ def format_timestamp(ts):
     return f"{day} {time}"
 
 
+# The number of notes fetched and rendered in the sidebar at a time.
+page_size = 50
+
+
+# How long the search box waits for typing to pause before searching,
+# in seconds.
+search_delay = 0.25
+
+
+async def search_when_idle(search_input, text):
+    """
+    Searches for `text` once the user stops typing. If `search_input`
+    has changed in the meantime, a newer search is on its way and this
+    one is skipped.
+    """
+    await asyncio.sleep(search_delay)
+    if search_input.value != text:
+        return None
+    return await asyncio.to_thread(search_notes, text)
+
+
 @hd.global_state
-class NotesTask(hd.task):
-    def run(self):
-        super().run(get_notes)
+class NotesState(hd.BaseState):
+    # The notes in the sidebar. See `note_list.py`.
+    note_list = hd.Prop(hd.Any, None)
+    # The note list's version. Reading it subscribes the caller to
+    # changes to the list.
+    version = hd.Prop(hd.Int, 0)
+
+    def __init__(self):
+        super().__init__()
+        # The first time this state is instantiated, we create the
+        # list and start feeding it changes.
+        if self.note_list is None:
+            self.note_list = NoteList(page_size)
+            change_feed.subscribe(self.apply_change)
+
+    def apply_change(self, kind, note):
+        self.version = self.note_list.apply(kind, note)
+
+    def load_page(self):
+        """Reads the next page of notes into the list."""
+        self.version = self.note_list.load_page(get_notes)
+
+    def get_notes(self):
+        """Returns the loaded notes, newest first."""
+        # Read the version, so the caller re-renders when the list
+        # changes.
+        self.version
+        return self.note_list.newest_first()
 
 
 @router.route("/note/{note_id}")
 def edit_note(note_id):
-    # Task that loads the note from the DB
+    # Task that loads the note from the DB, along with any edits that
+    # haven't been saved yet.
     edited_note_task = hd.task()
-    edited_note_task.run(read_note, note_id)
+    edited_note_task.run(autosaver.read, note_id, read_note)
 
     # If the note hasn't loaded yet, we render nothing.
     if not edited_note_task.done:
         return
 
     window = hd.window()
-    notes_task = NotesTask()
-    state = hd.state(editing=False)
+    # `note_body` is the note as of this session's last edit, so the
+    # note doesn't have to be re-read after it is saved. `edits`
+    # counts the edits, and `saved` is the count as of the last save.
+    # `tail` is the part of a large note's body read so far, past its
+    # inline part, and `offset` is where to read from next.
+    state = hd.state(
+        editing=False,
+        history=False,
+        note_body=None,
+        edits=0,
+        saved=0,
+        tail="",
+        offset=0,
+    )
 
     note = edited_note_task.result
 
@@ -51,40 +124,76 @@ def edit_note(note_id):
         hd.text("This note does not exist.")
         return
 
+    note_body = note["note_body"] if state.note_body is None else state.note_body
+    # A large note is loaded with only the start of its body. The rest
+    # is read a page at a time as the user asks for it, and all at
+    # once before editing.
+    partial = state.note_body is None and note["more"] > 0
+
     # If the note is empty, open the editor by default.
-    if not note["note_body"]:
+    if not note_body:
         state.editing = True
 
+    if state.history:
+        revision_history(note_id, state)
+        return
+
     if not state.editing:
         with hd.hbox(gap=0.5):
             if hd.button("Edit", prefix_icon="pencil", size="small").clicked:
                 state.editing = True
-        hd.markdown(note["note_body"])
+            if hd.button("History", prefix_icon="clock-history", size="small").clicked:
+                state.history = True
+        if partial:
+            note_tail(note_id, note, state)
+        else:
+            markdown_document(note_body)
         return
 
+    if partial:
+        full_note_task = hd.task()
+        full_note_task.run(autosaver.read, note_id, read_full_note)
+        if not full_note_task.done:
+            hd.spinner()
+            return
+        if full_note_task.result is None:
+            hd.text("This note does not exist.")
+            return
+        note_body = state.note_body = full_note_task.result["note_body"]
+
     note_editor = hd.textarea(
         height="100%",
         input_base_style=hd.style(height="100%"),
         input_wrapper_style=hd.style(height="100%"),
         input_style=hd.style(height="100%", font_family="mono"),
         placeholder="Type your note here, using Markdown.",
-        value=note["note_body"],
+        value=note_body,
         collect=False,
     )
 
-    with hd.hbox(gap=0.5):
-        save_button = hd.button(
-            "Save",
-            prefix_icon="download",
-            size="small",
-            disabled=not note_editor.value and not note["note_body"],
-        )
-        cancel_button = hd.button(
-            "Cancel",
-            prefix_icon="x",
+    # Schedule a save on every edit. Saving happens on the
+    # autosaver's thread, so rendering doesn't wait for it.
+    if note_editor.value != note_body:
+        state.note_body = note_editor.value
+        state.edits += 1
+        edits = state.edits
+
+        def on_saved():
+            state.saved = edits
+
+        autosaver.schedule(note_id, note_editor.value, on_saved)
+
+    with hd.hbox(gap=0.5, align="center"):
+        done_button = hd.button(
+            "Done",
+            prefix_icon="check",
             size="small",
-            disabled=not note_editor.value and not note["note_body"],
+            disabled=not note_editor.value,
         )
+        if state.edits > state.saved:
+            hd.text("Saving...", font_size="small", font_color="neutral-500")
+        elif state.edits > 0:
+            hd.text("Saved", font_size="small", font_color="neutral-500")
 
     if window.width < 1200:
         # On small screens, render the editor and preview in tabs.
@@ -93,36 +202,113 @@ def edit_note(note_id):
             if tabs.active == "Edit":
                 note_editor.collect()
             else:
-                hd.markdown(note_editor.value)
+                markdown_document(note_editor.value)
     else:
         # On large screens, render them side by side.
         with hd.hbox(gap=1, vertical_scroll=False, height="100%"):
             with hd.box(width="50%", height="100%"):
                 note_editor.collect()
             with hd.box(width="50%", vertical_scroll=True):
-                hd.markdown(note_editor.value)
-
-    if save_button.clicked:
-        save_note(
-            note_id,
-            extract_title(note_editor.value),
-            note_editor.value,
-        )
-        # Clear the task so the note re-renders with the
-        # new content.
-        edited_note_task.clear()
-        # Clear the notes task, so the list in the sidebar re-renders
-        notes_task.clear()
+                markdown_document(note_editor.value)
 
-    if save_button.clicked or cancel_button.clicked:
+    if done_button.clicked:
+        # Save the last edits without waiting for the delay.
+        autosaver.save_now(note_id)
         note_editor.reset()
         state.editing = False
 
 
+def note_tail(note_id, note, state):
+    """Renders a large note, as much of it as has been read."""
+    # Task that reads the next page of the body.
+    tail_task = hd.task()
+    if tail_task.done:
+        text, state.offset = tail_task.result
+        state.tail += text
+        tail_task.clear()
+
+    markdown_document(note["note_body"] + state.tail)
+
+    if state.offset < note["more"]:
+        if tail_task.running:
+            hd.spinner()
+        elif hd.button("Load more", size="small", variant="text").clicked:
+            tail_task.run(read_note_tail, note_id, state.offset)
+
+
+def revision_history(note_id, state):
+    """Lets the user browse the note's revisions, and restore one."""
+    revisions_task = hd.task()
+    revisions_task.run(get_revisions, note_id)
+    # Task that rebuilds the revision picked on the slider.
+    revision_task = hd.task()
+
+    with hd.hbox(gap=0.5, align="center"):
+        back_button = hd.button("Back", prefix_icon="arrow-left", size="small")
+        restore_button = hd.button(
+            "Restore",
+            prefix_icon="arrow-counterclockwise",
+            size="small",
+            disabled=not revision_task.done,
+        )
+
+    if back_button.clicked:
+        # Clear the tasks, so the history is re-read next time.
+        revisions_task.clear()
+        revision_task.clear()
+        state.history = False
+        return
+
+    if not revisions_task.done:
+        return
+
+    revisions = revisions_task.result
+    if not revisions:
+        hd.text("This note has no history yet.")
+        return
+
+    # Revisions are numbered from 0, so a revision's number is its
+    # index in `revisions`.
+    latest = len(revisions) - 1
+    slider = hd.slider(min_value=0, max_value=latest, value=latest)
+    revision = int(slider.value)
+    hd.text(
+        f"Revision {revision} of {latest}, saved "
+        f"{format_timestamp(revisions[revision]['ts'])}",
+        font_size="small",
+        font_color="neutral-500",
+    )
+
+    if slider.changed:
+        revision_task.clear()
+    revision_task.run(read_revision, note_id, revision)
+
+    if restore_button.clicked:
+        # Saving the old body makes it the newest revision.
+        note_body = revision_task.result
+        state.note_body = note_body
+        autosaver.schedule(note_id, note_body)
+        autosaver.save_now(note_id)
+        revisions_task.clear()
+        revision_task.clear()
+        state.history = False
+        return
+
+    if revision_task.result is not None:
+        markdown_document(revision_task.result)
+
+
 def notes_list(drawer):
     loc = hd.location()
 
-    notes_task = NotesTask()
+    notes_state = NotesState()
+    # Loads the next page of notes into the list.
+    load_task = hd.task()
+
+    # The results of the last finished search, and whether they are
+    # only the best of the most recent matches. See `search_notes`.
+    search_state = hd.state(results=(), partial=False)
+    search_task = hd.task()
 
     # The delete confirmation dialog.
     # This state stores the note to delete:
@@ -138,60 +324,104 @@ def notes_list(drawer):
                     # When canceling, do nothing.
                     if hd.button("Cancel").clicked:
                         delete_dialog.opened = False
-                    # If delete was clicked, delete the note and clear
-                    # the notes_task, which will re-read the notes
-                    # and cause the notes list to re-render:
+                    # If delete was clicked, delete the note. The
+                    # change feed removes it from the notes list:
                     if hd.button("Delete", variant="danger").clicked:
                         delete_note(delete_state.note["note_id"])
-                        notes_task.clear()
                         delete_dialog.opened = False
+                        search_state.results = tuple(
+                            n
+                            for n in search_state.results
+                            if n["note_id"] != delete_state.note["note_id"]
+                        )
                         if loc.path == f"/note/{delete_state.note['note_id']}":
                             loc.path = "/"
 
     # Render the main note list.
     if hd.button("New Note", prefix_icon="pencil", width=None, size="small").clicked:
         note_id = create_empty_note()
-        notes_task.clear()
         drawer.opened = False
         loc.go(f"/note/{note_id}")
 
-    notes_task.run()
-
-    # We don't check for `task.done`, to avoid re-rendering
-    # the whole list when the task is cleared. Instead, we
-    # render the "old list" while the task is re-running.
-    if notes_task.result:
-        for note in notes_task.result:
-            link_path = f"/note/{note['note_id']}"
-            with hd.scope(note["note_id"]):
-                with hd.link(
-                    href=link_path,
-                    background_color="neutral-100" if loc.path == link_path else None,
-                    hover_background_color="neutral-50",
-                    border_radius="large",
-                    padding=1,
-                ) as link:
-                    with hd.hbox(gap=1, justify="space-between", align="center"):
-                        hd.text(note["note_title"] or "[ New Note ]")
-                        if hd.icon_button(
-                            "x",
-                            font_color="neutral-400",
-                            font_size=1.5,
-                            padding=0,
-                        ).clicked:
-                            # If delete is clicked, set the
-                            # note to delete and open the
-                            # dialog.
-                            delete_state.note = note
-                            delete_dialog.opened = True
-
-                    hd.text(
-                        format_timestamp(note["ts"]),
-                        font_size="x-small",
-                        font_color="neutral-400",
-                    )
-                if link.clicked:
-                    drawer.opened = False
+    search_input = hd.text_input(
+        placeholder="Search notes",
+        prefix_icon="search",
+        size="small",
+        clearable=True,
+    )
+    if search_input.changed:
+        search_task.clear()
+
+    if search_input.value.strip():
+        search_task.run(search_when_idle, search_input, search_input.value)
+        if search_task.finished and search_task.result is not None:
+            results, search_state.partial = search_task.result
+            search_state.results = tuple(results)
+        # Keep showing the previous results until the new ones arrive.
+        for note in search_state.results:
+            note_link(note, loc, drawer, delete_state, delete_dialog)
+        if search_state.partial and search_state.results:
+            hd.text(
+                "Many notes match. These are the best of the most recent "
+                "ones; add words to narrow the search.",
+                font_color="neutral-500",
+                font_size="small",
+            )
+        if search_task.done and not search_state.results:
+            hd.text("No matching notes.", font_color="neutral-500")
+        return
+
+    notes = notes_state.get_notes()
+    note_list = notes_state.note_list
+    if not note_list.loaded:
+        load_task.run(notes_state.load_page)
+        return
+
+    for note in notes:
+        note_link(note, loc, drawer, delete_state, delete_dialog)
+
+    # Offer to load the next page if the last page was full.
+    if note_list.has_more:
+        if load_task.running:
+            hd.spinner()
+        elif hd.button("Load more", size="small", variant="text").clicked:
+            load_task.rerun(notes_state.load_page)
+
+
+def note_link(note, loc, drawer, delete_state, delete_dialog):
+    """Renders the sidebar link to `note`."""
+    link_path = f"/note/{note['note_id']}"
+    with hd.scope(note["note_id"]):
+        with hd.link(
+            href=link_path,
+            background_color="neutral-100" if loc.path == link_path else None,
+            hover_background_color="neutral-50",
+            border_radius="large",
+            padding=1,
+        ) as link:
+            with hd.hbox(gap=1, justify="space-between", align="center"):
+                hd.text(note["note_title"] or "[ New Note ]")
+                if hd.icon_button(
+                    "x",
+                    font_color="neutral-400",
+                    font_size=1.5,
+                    padding=0,
+                ).clicked:
+                    # If delete is clicked, set the
+                    # note to delete and open the
+                    # dialog.
+                    delete_state.note = note
+                    delete_dialog.opened = True
+
+            if note.get("snippet"):
+                hd.text(note["snippet"], font_size="small", font_color="neutral-600")
+            hd.text(
+                format_timestamp(note["ts"]),
+                font_size="x-small",
+                font_color="neutral-400",
+            )
+        if link.clicked:
+            drawer.opened = False
 
 
 @router.route("/")
@@ -204,9 +434,45 @@ def not_found():
     hd.markdown(f"Invalid path: `{hd.location().path}`")
 
 
+def maintenance():
+    """
+    Shown in place of the app while the database is migrated, with the
+    migration's progress.
+    """
+    status = migrator.status()
+    with hd.box(gap=1, padding=2, max_width=30):
+        if status.error:
+            hd.text("Updating the database failed.", font_weight="bold")
+            hd.text(status.error, font_color="neutral-500")
+            return
+        hd.text("Updating the database...", font_weight="bold")
+        if status.step:
+            hd.text(
+                f"Step {status.step} of {status.steps} ({status.label})",
+                font_size="small",
+                font_color="neutral-500",
+            )
+        hd.progress_bar(
+            value=round(100 * (status.step - 1 + status.progress) / status.steps)
+            if status.step
+            else 0
+        )
+
+    # Task that waits for the migration to make progress, and so
+    # re-renders this page when it does.
+    progress_task = hd.task()
+    if progress_task.done:
+        progress_task.clear()
+    progress_task.run(migrator.wait, status.version)
+
+
 def main():
     template = hd.template(title="Note Taking App")
     template.sidebar.padding = (2, 1, 2, 1)
+    if not migrator.status().done:
+        with template.body:
+            maintenance()
+        return
     with template.sidebar:
         notes_list(template.drawer)
     with template.body:
@@ -0,0 +1,161 @@
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+import hyperdiv as hd
+from hyperdiv.sqlite import sqlite_tx
+
+# A snapshot of a migration run. `version` changes whenever the rest
+# does. `step` is the number of the migration being applied, out of
+# `steps`, and `progress` is how far along it is, from 0 to 1.
+Status = namedtuple("Status", "version done error step steps label progress")
+
+
+class Batched:
+    """
+    A migration that runs in batches, each in its own transaction, so
+    that it doesn't hold the database for its whole length, and picks
+    up where it left off if the app is restarted partway through.
+
+    `run_batch(cursor)` migrates a batch and returns its size, or 0
+    when there is nothing left to migrate. `count(cursor)` returns how
+    much is left, for reporting progress.
+    """
+
+    def __init__(self, run_batch, count):
+        self.run_batch = run_batch
+        self.count = count
+        self.__name__ = run_batch.__name__
+
+
+def label(migration):
+    name = getattr(migration, "__name__", "<lambda>")
+    return "sql" if name == "<lambda>" else name
+
+
+class Migrator:
+    """
+    Applies migrations like `hyperdiv.sqlite.migrate`, and to the same
+    `_Migration` table, but one transaction per migration (or per
+    batch, for `Batched` migrations), so it can run on a background
+    thread while the app serves a maintenance page, which reads its
+    progress with `status()` and `wait()`.
+
+    Each step re-checks the migration count in its transaction, so a
+    step that another process applied meanwhile is skipped.
+    """
+
+    def __init__(self, db, migrations, timeout=5.0):
+        self.db = db
+        self.migrations = migrations
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.thread = None
+        # The time each migration applied took, as `(label, seconds)`.
+        self.timings = []
+        self.current = Status(0, False, None, 0, len(migrations), None, 0.0)
+
+    def status(self):
+        with self.cond:
+            return self.current
+
+    def update(self, **changes):
+        with self.cond:
+            self.current = self.current._replace(
+                version=self.current.version + 1, **changes
+            )
+            self.cond.notify_all()
+
+    def wait(self, version, timeout=5.0):
+        """
+        Waits up to `timeout` seconds for the status to change from
+        `version`, and returns it.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.current.version != version, timeout)
+            return self.current
+
+    def start(self):
+        """Applies the migrations on a background thread."""
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run_in_background, name="migrate", daemon=True
+                )
+                self.thread.start()
+
+    def run_in_background(self):
+        try:
+            self.run()
+        except Exception as e:
+            hd.logger.error(f"Migrating {self.db} failed: {e}")
+
+    def transaction(self):
+        return sqlite_tx(self.db, timeout=self.timeout)
+
+    def run(self):
+        """Applies the migrations on this thread."""
+        try:
+            migration_id = self.read_migration_id()
+            if len(self.migrations) < migration_id:
+                raise Exception("The migration list got smaller.")
+            print(f"Applying {len(self.migrations) - migration_id} migrations.")
+
+            for n in range(migration_id, len(self.migrations)):
+                migration = self.migrations[n]
+                self.update(step=n + 1, label=label(migration), progress=0.0)
+                start = time.perf_counter()
+                if isinstance(migration, Batched):
+                    self.apply_batched(n, migration)
+                else:
+                    with self.transaction() as (_, cursor):
+                        if self.claim(cursor, n):
+                            migration(cursor)
+                elapsed = time.perf_counter() - start
+                self.timings.append((label(migration), elapsed))
+                print(f"Migration {n + 1} ({label(migration)}): {elapsed:.3f}s")
+            self.update(done=True, progress=1.0)
+        except Exception as e:
+            self.update(error=str(e))
+            raise
+
+    def read_migration_id(self):
+        with self.transaction() as (_, cursor):
+            try:
+                cursor.execute("select migration_id from _Migration")
+            except sqlite3.OperationalError as e:
+                if "no such table" not in str(e):
+                    raise
+                cursor.execute(
+                    "create table _Migration (migration_id integer not null)"
+                )
+                cursor.execute("insert into _Migration (migration_id) values (0)")
+                return 0
+            return cursor.fetchone()["migration_id"]
+
+    def claim(self, cursor, n):
+        """
+        Marks migration `n` as applied, in the transaction applying it,
+        unless it was applied already.
+        """
+        cursor.execute(
+            "update _Migration set migration_id = ? where migration_id = ?",
+            (n + 1, n),
+        )
+        return cursor.rowcount == 1
+
+    def apply_batched(self, n, migration):
+        with self.transaction() as (_, cursor):
+            total = migration.count(cursor)
+        migrated = 0
+        while True:
+            with self.transaction() as (_, cursor):
+                cursor.execute("select migration_id from _Migration")
+                if cursor.fetchone()["migration_id"] != n:
+                    return
+                size = migration.run_batch(cursor)
+                if size == 0:
+                    self.claim(cursor, n)
+                    return
+            migrated += size
+            self.update(progress=min(1.0, migrated / total) if total else 1.0)
@@ -0,0 +1,76 @@
+import bisect
+import threading
+
+
+class NoteList:
+    """
+    The notes shown in the sidebar, newest first, kept up to date by
+    applying the changes from the change feed instead of re-reading
+    them.
+
+    The list holds every note newer than its oldest note, which is
+    where the next page is read from. Since a written note gets the
+    current time, it always goes at the top, so a change never needs
+    more than one insertion and one removal.
+    """
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        # The `(ts, note_id)` of each note, oldest first.
+        self.keys = []
+        # Maps each note_id to its note.
+        self.notes = {}
+        self.loaded = False
+        self.has_more = True
+        # Incremented on every change to the list.
+        self.version = 0
+
+    @staticmethod
+    def key(note):
+        return (note["ts"], note["note_id"])
+
+    def _insert(self, note):
+        key = self.key(note)
+        # A note older than the list's oldest note belongs to a page
+        # that hasn't been read yet.
+        if self.has_more and self.keys and key < self.keys[0]:
+            return
+        bisect.insort(self.keys, key)
+        self.notes[note["note_id"]] = note
+
+    def _remove(self, note_id):
+        note = self.notes.pop(note_id, None)
+        if note is not None:
+            del self.keys[bisect.bisect_left(self.keys, self.key(note))]
+
+    def load_page(self, get_notes):
+        """
+        Reads the next page of notes with `get_notes(after, limit)`.
+        The read happens under the lock, so changes made while it runs
+        are applied after the page, rather than being overwritten by it.
+        Returns the list's version.
+        """
+        with self.lock:
+            after = self.keys[0] if self.keys else None
+            page = get_notes(after=after, limit=self.page_size)
+            # The page is older than every note in the list.
+            self.keys[:0] = [self.key(note) for note in reversed(page)]
+            self.notes.update((note["note_id"], note) for note in page)
+            self.has_more = len(page) == self.page_size
+            self.loaded = True
+            self.version += 1
+            return self.version
+
+    def apply(self, kind, note):
+        """Applies a change from the change feed. Returns the list's version."""
+        with self.lock:
+            self._remove(note["note_id"])
+            if kind != "deleted":
+                self._insert(note)
+            self.version += 1
+            return self.version
+
+    def newest_first(self):
+        with self.lock:
+            return [self.notes[note_id] for _, note_id in reversed(self.keys)]
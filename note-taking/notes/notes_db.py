@@ -1,8 +1,12 @@
 import os
 import uuid
-from hyperdiv.sqlite import sqlite, migrate, sql
+from hyperdiv.sqlite import sql
+from .db_pool import ConnectionPool
+from .migrator import Migrator, Batched
+from .change_feed import change_feed
+from .revisions import encode_revision, snapshot_interval, rebuild
 
-db = os.path.abspath(
+db = os.environ.get("NOTES_DB") or os.path.abspath(
     os.path.join(
         os.path.dirname(__file__),
         "..",
@@ -10,6 +14,68 @@ db = os.path.abspath(
     )
 )
 
+# Connections shared by the app's tasks. See `db_pool.py`.
+pool = ConnectionPool(db)
+
+# Large note bodies are split in two: their first `inline_size`
+# characters or so stay in Note.note_body, and the rest is stored as
+# UTF-8 in NoteBlob, where it is read a page at a time, with
+# incremental blob I/O, only when asked for. Search only indexes the
+# inline part, so text in the rest isn't found.
+inline_size = 64 * 1024
+# How many bytes `read_note_tail` reads at a time.
+tail_page_size = 256 * 1024
+
+
+def split_body(note_body):
+    """
+    Returns the part of `note_body` stored inline, and the rest, as
+    UTF-8, or None if the body is stored whole. Bodies are split after
+    a newline, when there is one, so the parts render on their own.
+    """
+    if len(note_body) <= inline_size:
+        return note_body, None
+    cut = note_body.rfind("\n", 0, inline_size) + 1 or inline_size
+    return note_body[:cut], note_body[cut:].encode("utf-8")
+
+
+def write_tail(cursor, note_id, tail):
+    cursor.execute("delete from NoteBlob where note_id = ?", (note_id,))
+    if tail is not None:
+        cursor.execute(
+            "insert into NoteBlob (note_id, data) values (?, ?)",
+            (note_id, tail),
+        )
+
+
+def split_large_bodies(cursor, batch_size=100):
+    """
+    Moves the tails of a batch of existing large bodies to NoteBlob,
+    and returns how many were moved.
+    """
+    cursor.execute(
+        "select note_id, note_body from Note where length(note_body) > ? limit ?",
+        (inline_size, batch_size),
+    )
+    notes = cursor.fetchall()
+    for note in notes:
+        head, tail = split_body(note["note_body"])
+        cursor.execute(
+            "update Note set note_body = ? where note_id = ?",
+            (head, note["note_id"]),
+        )
+        write_tail(cursor, note["note_id"], tail)
+    return len(notes)
+
+
+def count_large_bodies(cursor):
+    cursor.execute(
+        "select count(*) as n from Note where length(note_body) > ?",
+        (inline_size,),
+    )
+    return cursor.fetchone()["n"]
+
+
 migrations = [
     sql(
         """
@@ -20,17 +86,110 @@ migrations = [
             ts int
         )
         """
-    )
+    ),
+    # Lets `get_notes` walk the notes in `ts` order without sorting
+    # the whole table. Replaced by NoteList below.
+    sql("create index NoteTs on Note (ts, note_id)"),
+    # A full-text index over note titles and bodies. It is an
+    # "external content" table: it doesn't store the text itself, and
+    # reads it from Note's rows, matched by rowid. Note has no integer
+    # primary key, so a VACUUM may renumber its rowids; after one, run
+    # `insert into NoteFts (NoteFts) values ('rebuild')`.
+    sql(
+        """
+        create virtual table NoteFts using fts5 (
+            note_title,
+            note_body,
+            content = 'Note',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """
+    ),
+    # Triggers keep the index in sync with the Note table.
+    sql(
+        """
+        create trigger NoteFtsInsert after insert on Note begin
+            insert into NoteFts (rowid, note_title, note_body)
+            values (new.rowid, new.note_title, new.note_body);
+        end
+        """
+    ),
+    sql(
+        """
+        create trigger NoteFtsDelete after delete on Note begin
+            insert into NoteFts (NoteFts, rowid, note_title, note_body)
+            values ('delete', old.rowid, old.note_title, old.note_body);
+        end
+        """
+    ),
+    sql(
+        """
+        create trigger NoteFtsUpdate after update of note_title, note_body on Note
+        begin
+            insert into NoteFts (NoteFts, rowid, note_title, note_body)
+            values ('delete', old.rowid, old.note_title, old.note_body);
+            insert into NoteFts (rowid, note_title, note_body)
+            values (new.rowid, new.note_title, new.note_body);
+        end
+        """
+    ),
+    # Index the notes that existed before the index did.
+    sql("insert into NoteFts (NoteFts) values ('rebuild')"),
+    # The history of each note's body, numbered from 0. `data` is a
+    # compressed snapshot or delta. See `revisions.py`.
+    sql(
+        """
+        create table Revision (
+            note_id text,
+            revision int,
+            ts int,
+            data blob,
+            primary key (note_id, revision)
+        ) without rowid
+        """
+    ),
+    # The tails of large note bodies. Incremental blob I/O needs a
+    # rowid table.
+    sql(
+        """
+        create table NoteBlob (
+            note_id text unique,
+            data blob
+        )
+        """
+    ),
+    Batched(split_large_bodies, count_large_bodies),
+    # A covering index for `get_notes`, so listing notes reads only
+    # the index. Reading note_title or ts from Note means reading past
+    # note_body, including every overflow page of a large body.
+    sql("create index NoteList on Note (ts, note_id, note_title)"),
+    sql("drop index NoteTs"),
 ]
 
 
+# Applies the migrations. The app runs it in the background, serving a
+# maintenance page meanwhile. See `migrator.py`.
+migrator = Migrator(db, migrations)
+
+
 def migrate_notes_db():
-    migrate(db, migrations)
+    """Applies the migrations before returning, for scripts."""
+    migrator.run()
+
+
+def extract_title(note_body):
+    if not note_body:
+        return ""
+    else:
+        # Slice out the first line, rather than splitting, to avoid
+        # copying the rest of a large note.
+        end = note_body.find("\n")
+        return (note_body if end < 0 else note_body[:end]).lstrip(" #")
 
 
 def create_empty_note():
     note_id = uuid.uuid4().hex
-    with sqlite(db) as (_, cursor):
+    with pool.connection() as (_, cursor):
         cursor.execute(
             """
             insert into Note (
@@ -38,39 +197,211 @@ def create_empty_note():
             ) values (
                 ?, "", "", strftime('%s', 'now')
             )
+            returning note_id, note_title, ts
             """,
             (note_id,),
         )
+        note = cursor.fetchone()
+    change_feed.emit("inserted", note)
     return note_id
 
 
 def read_note(note_id):
-    with sqlite(db) as (_, cursor):
+    """
+    Returns the note with the inline part of its body. `more` is the
+    size in bytes of the rest, which can be read with
+    `read_note_tail`.
+    """
+    with pool.connection() as (_, cursor):
         cursor.execute(
             """
-            select note_body, note_title, ts from Note
+            select
+                note_body,
+                note_title,
+                ts,
+                coalesce(
+                    (select length(data) from NoteBlob where note_id = ?), 0
+                ) as more
+            from Note
             where note_id = ?
             """,
-            (note_id,),
+            (note_id, note_id),
         )
         results = cursor.fetchall()
         return results[0] if len(results) > 0 else None
 
 
-def get_notes():
-    with sqlite(db) as (_, cursor):
+def read_tail(cursor, note_id):
+    cursor.execute("select data from NoteBlob where note_id = ?", (note_id,))
+    row = cursor.fetchone()
+    return row["data"].decode("utf-8") if row else ""
+
+
+def read_full_note(note_id):
+    """Returns the note with its whole body."""
+    with pool.connection() as (_, cursor):
         cursor.execute(
             """
+            select
+                Note.note_body || coalesce(cast(NoteBlob.data as text), '')
+                    as note_body,
+                note_title,
+                ts,
+                0 as more
+            from Note left join NoteBlob using (note_id)
+            where note_id = ?
+            """,
+            (note_id,),
+        )
+        results = cursor.fetchall()
+        return results[0] if len(results) > 0 else None
+
+
+def read_note_tail(note_id, offset, size=tail_page_size):
+    """
+    Reads about `size` bytes of the note's body, starting `offset`
+    bytes past its inline part. Returns the text, which ends at a line
+    break when possible, and the offset to read from next.
+    """
+    with pool.connection() as (conn, cursor):
+        cursor.execute("select rowid from NoteBlob where note_id = ?", (note_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return "", offset
+        with conn.blobopen("NoteBlob", "data", row["rowid"], readonly=True) as blob:
+            blob.seek(offset)
+            data = blob.read(size)
+            at_end = offset + len(data) >= len(blob)
+
+    if not at_end:
+        # End after the last line break, or else after the last whole
+        # character.
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            cut = len(data)
+            # Back up to the start of the last character, which may
+            # have been cut.
+            while cut > 0 and data[cut - 1] & 0xC0 == 0x80:
+                cut -= 1
+            if cut > 0 and data[cut - 1] >= 0xC0:
+                cut -= 1
+        data = data[:cut]
+    return data.decode("utf-8"), offset + len(data)
+
+
+def get_notes(after=None, limit=None):
+    """
+    Returns the notes, newest first. The notes can be fetched a page at
+    a time: `limit` is the size of the page, and `after` is the
+    `(ts, note_id)` of the last note of the previous page.
+    """
+    where = ""
+    params = []
+    if after is not None:
+        where = "where (ts, note_id) < (?, ?)"
+        params += after
+    if limit is not None:
+        params.append(limit)
+
+    with pool.connection() as (_, cursor):
+        cursor.execute(
+            f"""
             select note_id, note_title, ts
             from Note
-            order by ts desc
-            """
+            {where}
+            order by ts desc, note_id desc
+            {"limit ?" if limit is not None else ""}
+            """,
+            params,
         )
         return cursor.fetchall()
 
 
+def to_fts_query(text):
+    """
+    Turns user input into an FTS5 query that matches notes containing
+    all of its words, the last one as a prefix, so results show up
+    while the last word is still being typed. Each word is quoted, so
+    FTS5 syntax in the input is matched literally.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if not terms:
+        return None
+    if not text[-1].isspace():
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_notes(text, limit=20, candidates=2000):
+    """
+    Returns `(notes, partial)`: up to `limit` notes matching `text`,
+    each with a `snippet` of its body around the matched words, and
+    whether they are only the best of some of the matches.
+
+    When up to `candidates` notes match, all of them are ranked, and
+    the notes are the best matches. Ranking every match of a common
+    word is slow in a large notebook, so when more notes match, only
+    the `candidates` most recently created ones are ranked, and
+    `partial` is true. FTS5 can produce those in rowid order without
+    scoring the rest.
+    """
+    query = to_fts_query(text)
+    if query is None:
+        return [], False
+    with pool.connection() as (_, cursor):
+        # Counting stops past `candidates`, so it stays cheap however
+        # many notes match.
+        cursor.execute(
+            """
+            select count(*) as n from (
+                select rowid from NoteFts where NoteFts match ? limit ?
+            )
+            """,
+            (query, candidates + 1),
+        )
+        partial = cursor.fetchone()["n"] > candidates
+        # Snippets are made in the same pass as the ranks, since
+        # finding a note's matches again in a second query costs more
+        # than making snippets for every candidate.
+        cursor.execute(
+            """
+            with Match as (
+                select
+                    rowid,
+                    rank,
+                    snippet(NoteFts, 1, '', '', '...', 12) as snippet
+                from NoteFts
+                where NoteFts match ?
+                order by rowid desc
+                limit ?
+            ),
+            Best as (
+                select * from Match order by rank limit ?
+            )
+            select Note.note_id, Note.note_title, Note.ts, Best.snippet
+            from Best
+            join Note on Note.rowid = Best.rowid
+            order by Best.rank
+            """,
+            (query, candidates, limit),
+        )
+        return cursor.fetchall(), partial
+
+
 def save_note(note_id, note_title, note_body):
-    with sqlite(db) as (_, cursor):
+    head, tail = split_body(note_body)
+    with pool.transaction() as (_, cursor):
+        cursor.execute(
+            "select note_body from Note where note_id = ?",
+            (note_id,),
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            old_body = row["note_body"] + read_tail(cursor, note_id)
+            if old_body != note_body:
+                add_revision(cursor, note_id, old_body, note_body)
+            write_tail(cursor, note_id, tail)
+
         cursor.execute(
             """
             update Note set
@@ -78,16 +409,86 @@ def save_note(note_id, note_title, note_body):
                 note_title = ?,
                 ts = strftime('%s', 'now')
             where note_id = ?
+            returning note_id, note_title, ts
+            """,
+            (head, note_title, note_id),
+        )
+        note = cursor.fetchone()
+    if note is not None:
+        change_feed.emit("updated", note)
+
+
+def add_revision(cursor, note_id, old_body, new_body):
+    """Records `new_body` as the next revision of the note."""
+    cursor.execute(
+        "select max(revision) as revision from Revision where note_id = ?",
+        (note_id,),
+    )
+    last = cursor.fetchone()["revision"]
+    if last is None:
+        # The note's first save. Keep what it had before, unless it
+        # was a new, empty note.
+        revision = 0
+        if old_body:
+            insert_revision(cursor, note_id, revision, "", old_body)
+            revision += 1
+    else:
+        revision = last + 1
+    insert_revision(cursor, note_id, revision, old_body, new_body)
+
+
+def insert_revision(cursor, note_id, revision, old_body, new_body):
+    cursor.execute(
+        """
+        insert into Revision (note_id, revision, ts, data)
+        values (?, ?, strftime('%s', 'now'), ?)
+        """,
+        (note_id, revision, encode_revision(revision, old_body, new_body)),
+    )
+
+
+def get_revisions(note_id):
+    """Returns the `revision` and `ts` of each of the note's revisions."""
+    with pool.connection() as (_, cursor):
+        cursor.execute(
+            """
+            select revision, ts from Revision
+            where note_id = ?
+            order by revision
+            """,
+            (note_id,),
+        )
+        return cursor.fetchall()
+
+
+def read_revision(note_id, revision):
+    """Returns the note's body as of `revision`, or None."""
+    with pool.connection() as (_, cursor):
+        # Rebuild it from the last snapshot at or before it.
+        cursor.execute(
+            """
+            select revision, data from Revision
+            where note_id = ? and revision between ? and ?
+            order by revision
             """,
-            (note_body, note_title, note_id),
+            (note_id, revision - revision % snapshot_interval, revision),
         )
+        rows = [(row["revision"], row["data"]) for row in cursor.fetchall()]
+    if not rows or rows[-1][0] != revision:
+        return None
+    return rebuild(rows)
 
 
 def delete_note(note_id):
-    with sqlite(db) as (_, cursor):
+    with pool.transaction() as (_, cursor):
         cursor.execute(
             """
             delete from Note where note_id = ?
             """,
             (note_id,),
         )
+        deleted = cursor.rowcount > 0
+        cursor.execute("delete from Revision where note_id = ?", (note_id,))
+        cursor.execute("delete from NoteBlob where note_id = ?", (note_id,))
+    if deleted:
+        change_feed.emit("deleted", dict(note_id=note_id))
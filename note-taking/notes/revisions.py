@@ -0,0 +1,85 @@
+import zlib
+import struct
+
+# A note's revisions are stored as deltas against the revision before
+# them. Every `snapshot_interval`-th revision is stored in full, so
+# rebuilding any revision applies at most `snapshot_interval - 1`
+# deltas to a snapshot.
+snapshot_interval = 50
+
+# A delta replaces the text between a common prefix and a common
+# suffix of the two revisions. Edits to a note are usually in one
+# place, which makes this small, and it is computed without diffing.
+delta_header = struct.Struct("<QQ")
+
+
+def is_snapshot(revision):
+    return revision % snapshot_interval == 0
+
+
+def common_prefix_length(a, b):
+    # Binary search over slice comparisons, which run at memcmp speed,
+    # rather than comparing a character at a time in Python.
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix_length(a, b, limit):
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid : len(a) - lo] == b[len(b) - mid : len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def encode_snapshot(text):
+    return zlib.compress(text.encode("utf-8"))
+
+
+def decode_snapshot(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+def encode_delta(old, new):
+    """Returns the delta that turns `old` into `new`."""
+    prefix = common_prefix_length(old, new)
+    suffix = common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    middle = new[prefix : len(new) - suffix]
+    return zlib.compress(delta_header.pack(prefix, suffix) + middle.encode("utf-8"))
+
+
+def apply_delta(old, data):
+    data = zlib.decompress(data)
+    prefix, suffix = delta_header.unpack_from(data)
+    middle = data[delta_header.size :].decode("utf-8")
+    return old[:prefix] + middle + old[len(old) - suffix :]
+
+
+def encode_revision(revision, old, new):
+    """Encodes `new`, the text of `revision`, whose previous text is `old`."""
+    if is_snapshot(revision):
+        return encode_snapshot(new)
+    return encode_delta(old, new)
+
+
+def rebuild(rows):
+    """
+    Rebuilds a revision's text from `rows`: the `(revision, data)` of
+    the snapshot before it, up to and including the revision itself.
+    """
+    text = None
+    for revision, data in rows:
+        if is_snapshot(revision):
+            text = decode_snapshot(data)
+        else:
+            text = apply_delta(text, data)
+    return text
@@ -1,7 +1,9 @@
 import hyperdiv as hd
 from notes.main import main
-from notes.notes_db import migrate_notes_db
+from notes.notes_db import migrator
 
 if __name__ == "__main__":
-    migrate_notes_db()
+    # Migrate in the background, so the app can serve a maintenance
+    # page meanwhile, rather than not serving at all.
+    migrator.start()
     hd.run(main)
@@ -0,0 +1,227 @@
+"""
+Benchmarks the ping pipeline at increasing host counts, using a fake
+prober with deterministic latencies, failures and timeouts, so the
+numbers don't depend on the network.
+
+For each host count it reports:
+* sweep: the wall time for the ping task to ping every host once.
+* publish: the time to publish one sweep's samples, which is also how
+  long the publisher's write lock is held (on average and at most),
+  and the peak memory it allocates.
+* stats: the time to compute the data table's stat columns.
+* chart: the time to downsample every series for the chart, from
+  scratch (cold) and after one new sample per host (warm).
+
+Usage: python bench.py [--hosts 10,100,1000,10000] [--depth 600]
+"""
+
+import os
+import sys
+import time
+import zlib
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+# Keep the benchmark's samples out of the app's database.
+os.environ.setdefault(
+    "PING_HISTORY_DB", os.path.join(tempfile.mkdtemp(), "bench.db")
+)
+
+from ping import config, ping_task  # noqa: E402
+from ping.snapshot import SnapshotPublisher  # noqa: E402
+from ping.probe_pool import ThreadProbePool  # noqa: E402
+from ping.data_table import get_stat_columns  # noqa: E402
+from ping.downsample import Downsampler  # noqa: E402
+from ping.history_db import migrate_history_db  # noqa: E402
+
+
+class FakeProber:
+    """
+    Each host gets a fixed latency of 1-5ms, derived from its name.
+    One host in 50 always fails, and one in 200 always times out.
+    """
+
+    def probe(self, hostname, timeout):
+        h = zlib.crc32(hostname.encode("utf-8"))
+        if h % 200 == 1:
+            time.sleep(timeout)
+            raise TimeoutError("Timed out")
+        if h % 50 == 0:
+            raise Exception("Unreachable")
+        latency = 1 + h % 5
+        time.sleep(latency / 1000)
+        return float(latency)
+
+
+class TimedLock:
+    """A lock that records how long it is held each time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hold_times = []
+
+    def acquire(self, blocking=True):
+        acquired = self.lock.acquire(blocking)
+        if acquired:
+            self.acquired_at = time.perf_counter()
+        return acquired
+
+    def release(self):
+        self.hold_times.append(time.perf_counter() - self.acquired_at)
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class BenchState:
+    """Stands in for `PingState`, which needs a running Hyperdiv app."""
+
+    def __init__(self, publisher):
+        self.publisher = publisher
+        self.stop_event = threading.Event()
+
+    def get_snapshot(self):
+        return self.publisher.snapshot
+
+    def add_samples(self, samples):
+        self.publisher.publish_samples(samples)
+
+    def start_consuming(self):
+        self.publisher.start_consuming()
+
+    def stop_consuming(self):
+        self.publisher.stop_consuming()
+
+    def apply_commands(self):
+        self.publisher.apply_commands()
+
+
+def make_hosts(n):
+    return [f"host-{i}.example.com" for i in range(n)]
+
+
+def ms(seconds):
+    return f"{seconds * 1000:.2f}ms"
+
+
+def bench_sweep(hosts, sweeps=3):
+    """
+    Runs the real ping task against the fake prober, with every host
+    due as soon as its last ping is done, and measures how long it
+    takes to ping every host `sweeps` times.
+    """
+    publisher = SnapshotPublisher(hosts, capacity=sweeps + 1)
+    state = BenchState(publisher)
+    ping_task.PingState = lambda: state
+
+    thread = threading.Thread(target=ping_task.ping_task)
+    start = time.perf_counter()
+    thread.start()
+    series = list(publisher.snapshot.ping_values.values())
+    while min(s.count for s in series) < sweeps:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    state.stop_event.set()
+    thread.join()
+    return elapsed / sweeps
+
+
+def fill(hosts, depth):
+    publisher = SnapshotPublisher(hosts, capacity=depth)
+    prober = FakeProber()
+    latencies = {}
+    for host in hosts:
+        try:
+            latencies[host] = prober.probe(host, 0)
+        except Exception:
+            latencies[host] = None
+    for t in range(depth):
+        publisher.publish_samples([(h, t * 1000, latencies[h]) for h in hosts])
+    return publisher, latencies
+
+
+def bench_publish(publisher, latencies, rounds=5):
+    publisher.lock = TimedLock()
+    t = publisher.snapshot.ping_values[next(iter(latencies))].count * 1000
+    tracemalloc.start()
+    for i in range(rounds):
+        samples = [(h, t + i * 1000, v) for h, v in latencies.items()]
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        publisher.publish_samples(samples)
+        allocated = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    hold_times = publisher.lock.hold_times
+    return sum(hold_times) / len(hold_times), max(hold_times), allocated
+
+
+def bench_stats(publisher, rounds=5):
+    series = list(publisher.snapshot.ping_values.values())
+    start = time.perf_counter()
+    for _ in range(rounds):
+        get_stat_columns(series)
+    return (time.perf_counter() - start) / rounds
+
+
+def bench_chart(publisher, latencies, target=1024):
+    series = list(publisher.snapshot.ping_values.values())
+    downsamplers = [Downsampler(s, target) for s in series]
+
+    start = time.perf_counter()
+    for d in downsamplers:
+        d.update()
+    cold = time.perf_counter() - start
+
+    t = series[0].count * 1000
+    publisher.publish_samples([(h, t, v) for h, v in latencies.items()])
+    start = time.perf_counter()
+    for d in downsamplers:
+        d.update()
+    warm = time.perf_counter() - start
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ping pipeline.")
+    parser.add_argument("--hosts", default="10,100,1000,10000")
+    parser.add_argument("--depth", type=int, default=600, help="Samples per host.")
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # The fake prober's failures would flood the output.
+    logging.getLogger("hyperdiv").setLevel(logging.ERROR)
+
+    config.ping_interval = 0
+    config.jitter = 0
+    config.ping_timeout = args.timeout
+    ping_task.probe_pool = ThreadProbePool(FakeProber(), args.timeout, args.workers)
+    migrate_history_db()
+
+    print(
+        f"{'hosts':>6} {'sweep':>10} {'publish':>10} {'lock max':>10} "
+        f"{'alloc':>8} {'stats':>10} {'chart cold':>11} {'chart warm':>11}"
+    )
+    for n in [int(n) for n in args.hosts.split(",")]:
+        hosts = make_hosts(n)
+        sweep = bench_sweep(hosts)
+        publisher, latencies = fill(hosts, args.depth)
+        publish, lock_max, allocated = bench_publish(publisher, latencies)
+        stats = bench_stats(publisher)
+        cold, warm = bench_chart(publisher, latencies)
+        print(
+            f"{n:>6} {ms(sweep):>10} {ms(publish):>10} {ms(lock_max):>10} "
+            f"{allocated / 1024:>6.1f}KB {ms(stats):>10} {ms(cold):>11} {ms(warm):>11}"
+        )
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import re
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from .dns_cache import dns_cache
+
+# The number of DNS lookups run at the same time when importing.
+resolve_workers = 64
+
+label_re = re.compile(r"^(?!-)[a-z0-9-]{1,63}(?<!-)$", re.IGNORECASE)
+interval_re = re.compile(r"^(\d+\.?\d*|\.\d+)$")
+
+
+def parse_hosts(text):
+    """
+    Splits pasted or loaded text into hostnames. Hosts can be
+    separated by newlines, spaces or commas, and `#` starts a
+    comment. A number right after a host on the same line sets that
+    host's ping interval, in seconds, e.g. `example.com 30`.
+
+    Returns a dict mapping each host to its interval, or `None` for
+    the default. Duplicates are dropped, keeping the first occurrence,
+    but the last interval given.
+    """
+    hosts = {}
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        host = None
+        for field in re.split(r"[\s,]+", line):
+            if not field:
+                continue
+            if interval_re.match(field):
+                # Intervals of 0 or without a host are ignored.
+                if host is not None and float(field) > 0:
+                    hosts[host] = float(field)
+                continue
+            host = field.lower()
+            hosts.setdefault(host, None)
+    return hosts
+
+
+def validate_host(host):
+    """Returns why `host` isn't a valid hostname or IP, or `None`."""
+    try:
+        ipaddress.ip_address(host)
+        return None
+    except ValueError:
+        pass
+    if len(host) > 253:
+        return "Too long"
+    if not all(label_re.match(label) for label in host.rstrip(".").split(".")):
+        return "Invalid hostname"
+    return None
+
+
+def resolve_host(host):
+    try:
+        dns_cache.getaddrinfo(host)
+        return None
+    except OSError as e:
+        return f"Could not resolve: {e.strerror or e}"
+
+
+def check_hosts(hosts):
+    """
+    Validates and resolves `hosts`, running the DNS lookups
+    concurrently. Returns `(valid, invalid)`, where `valid` is the list
+    of hosts that can be pinged and `invalid` maps each other host to
+    the reason it was rejected.
+    """
+    invalid = {}
+    to_resolve = []
+    for host in hosts:
+        error = validate_host(host)
+        if error:
+            invalid[host] = error
+        else:
+            to_resolve.append(host)
+
+    with ThreadPoolExecutor(max_workers=resolve_workers) as executor:
+        errors = executor.map(resolve_host, to_resolve)
+        valid = []
+        for host, error in zip(to_resolve, errors):
+            if error:
+                invalid[host] = error
+            else:
+                valid.append(host)
+
+    return valid, invalid
+
+
+def load_hosts_file(path):
+    with open(path) as f:
+        return parse_hosts(f.read())
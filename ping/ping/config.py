@@ -0,0 +1,42 @@
+import os
+
+# Settings for the ping monitor. Each one can be overridden with an
+# environment variable of the same name, prefixed with `PING_`,
+# e.g. `PING_PROBER=tcp python start.py`.
+
+# How latency is measured. One of:
+# * "native": an in-process ICMP echo, falling back to a TCP connect
+#   when unprivileged ICMP sockets aren't permitted.
+# * "icmp": an in-process ICMP echo only.
+# * "tcp": the time it takes to open a TCP connection.
+# * "subprocess": runs the system `ping` command.
+prober = os.environ.get("PING_PROBER", "native")
+# The port used by the TCP prober.
+tcp_port = int(os.environ.get("PING_TCP_PORT", 443))
+# The maximum number of hosts that are pinged at the same time, per
+# shard when sharding.
+max_workers = int(os.environ.get("PING_MAX_WORKERS", 32))
+# The number of worker processes the hosts are split across. With 0,
+# the hosts are pinged from the app process.
+shards = int(os.environ.get("PING_SHARDS", 0))
+# How long to wait for a single host, in seconds, before counting the
+# ping as failed.
+ping_timeout = float(os.environ.get("PING_TIMEOUT", 2))
+# How often to ping each host, in seconds.
+ping_interval = float(os.environ.get("PING_INTERVAL", 1))
+# The longest a failing host backs off to between pings, in seconds.
+max_backoff = float(os.environ.get("PING_MAX_BACKOFF", 60))
+# How much each delay between pings is randomly stretched or shrunk,
+# as a fraction of the delay.
+jitter = float(os.environ.get("PING_JITTER", 0.1))
+# How many samples to keep for each host. At the default ping
+# interval, this is one hour of history, taking about 60KB per host.
+# Lower it when monitoring thousands of hosts.
+history_depth = int(os.environ.get("PING_HISTORY_DEPTH", 3600))
+# The SQLite database where ping samples are persisted.
+history_db = os.environ.get(
+    "PING_HISTORY_DB",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ping.db")),
+)
+# How many days of samples to keep in the database.
+retention_days = float(os.environ.get("PING_RETENTION_DAYS", 7))
@@ -11,37 +11,48 @@ def row_delete_button(hostname):
 
     with hd.box(padding=1):
         if hd.icon_button(
-            "x", font_color="red", disabled=len(state.ping_values) <= 1
+            "x", font_color="red", disabled=len(state.get_ping_values()) <= 1
         ).clicked:
             state.remove_host(hostname)
 
 
-def get_minmax_value(fn, pings):
-    if not pings:
-        return "?"
-    if any(t is None for _, t in pings):
-        return "?"
-    return fn(t for _, t in pings)
+stat_columns = {
+    "Min": "min",
+    "Avg": "avg",
+    "Max": "max",
+    "p50": "p50",
+    "p95": "p95",
+    "p99": "p99",
+    "Loss %": "loss",
+}
 
 
-def get_minmax_columns(ping_values):
-    return (
-        [get_minmax_value(min, v) for v in ping_values],
-        [get_minmax_value(max, v) for v in ping_values],
-    )
+def format_stat(value):
+    return "?" if value is None else round(value, 2)
+
+
+def get_stat_columns(ping_values):
+    """
+    Returns the table's stat columns, read from the rolling
+    aggregates each series keeps up to date, so the cost is constant
+    per host regardless of how many samples it has.
+    """
+    summaries = [series.stats.summary() for series in ping_values]
+    return {
+        name: [format_stat(summary[key]) for summary in summaries]
+        for name, key in stat_columns.items()
+    }
 
 
 def data_table():
     state = PingState()
 
-    host_column = tuple(state.ping_values.keys())
-    min_column, max_column = get_minmax_columns(state.ping_values.values())
+    ping_values = state.get_ping_values()
 
     hd.data_table(
         {
-            "Hostname": host_column,
-            "Min": min_column,
-            "Max": max_column,
+            "Hostname": tuple(ping_values.keys()),
+            **get_stat_columns(ping_values.values()),
         },
         row_actions=row_delete_button,
         id_column_name="Hostname",
@@ -0,0 +1,35 @@
+import time
+import socket
+
+
+class DnsCache:
+    """
+    Caches `socket.getaddrinfo` results, so that pinging a host, or
+    importing thousands of them, doesn't cost a DNS lookup every
+    time. Failed lookups are cached too, for a shorter time.
+    """
+
+    def __init__(self, ttl=300, negative_ttl=30):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Maps (host, port, type) to (expiry time, result, error).
+        self.entries = {}
+
+    def getaddrinfo(self, host, port=None, type=0):
+        key = (host, port, type)
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < now:
+            try:
+                result = socket.getaddrinfo(host, port, type=type)
+                entry = (now + self.ttl, result, None)
+            except OSError as e:
+                entry = (now + self.negative_ttl, None, e)
+            self.entries[key] = entry
+        _, result, error = entry
+        if error is not None:
+            raise error
+        return result
+
+
+dns_cache = DnsCache()
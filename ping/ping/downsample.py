@@ -0,0 +1,118 @@
+import math
+import threading
+import weakref
+
+
+def bucket_points(timestamps, latencies):
+    """
+    Reduces a bucket of samples to the points needed to draw it: its
+    lowest and highest latencies, plus its first failed ping, if any,
+    so that gaps in the line are preserved. The points are returned in
+    time order.
+    """
+    low = high = failure = None
+    for i, v in enumerate(latencies):
+        if math.isnan(v):
+            if failure is None:
+                failure = i
+        else:
+            if low is None or v < latencies[low]:
+                low = i
+            if high is None or v > latencies[high]:
+                high = i
+
+    return tuple(
+        (timestamps[i], None if i == failure else latencies[i])
+        for i in sorted({low, high, failure} - {None})
+    )
+
+
+class Downsampler:
+    """
+    Downsamples a `Series` to about `target` points with min/max
+    bucketing. Buckets are aligned to absolute sample indices, so
+    once a bucket is complete its points never change. Complete
+    buckets are cached, and an update only re-reads the buckets at the
+    edges of the window, so the cost of an update is independent of
+    the history depth.
+    """
+
+    def __init__(self, series, target):
+        self.series = series
+        # Each bucket yields up to 3 points, but usually 2.
+        self.max_buckets = max(1, target // 2)
+        self.bucket_size = 1
+        # Maps bucket number to the bucket's points, in bucket order.
+        self.buckets = {}
+        self.end = None
+        self.points = ()
+        self.lock = threading.Lock()
+
+    def _fit_bucket_size(self, n):
+        # The bucket size is a power of two, so it changes (and the
+        # cache is thrown away) only when the history doubles or
+        # halves.
+        size = 1
+        while n > size * self.max_buckets:
+            size *= 2
+        if size != self.bucket_size:
+            self.bucket_size = size
+            self.buckets = {}
+
+    def update(self):
+        """Returns the downsampled points, recomputing only if needed."""
+        with self.lock:
+            end = self.series.count
+            if end == self.end:
+                return self.points
+
+            start = max(0, end - self.series.capacity)
+            self._fit_bucket_size(end - start)
+            size = self.bucket_size
+
+            # Drop buckets that left the window.
+            first_bucket = start // size
+            for b in [b for b in self.buckets if b < first_bucket]:
+                del self.buckets[b]
+
+            points = []
+            for b in range(first_bucket, (end - 1) // size + 1):
+                lo = max(b * size, start)
+                hi = min((b + 1) * size, end)
+                bucket = self.buckets.get(b)
+                if bucket is None:
+                    read_from, timestamps, latencies = self.series.read(lo, hi)
+                    bucket = bucket_points(timestamps, latencies)
+                    # Cache only whole buckets, with none of their
+                    # samples overwritten while they were read.
+                    if hi - lo == size and read_from == lo:
+                        self.buckets[b] = bucket
+                points.extend(bucket)
+
+            self.end = end
+            self.points = tuple(points)
+            return self.points
+
+
+# One downsampler per series and target, shared by all sessions. The
+# entries go away with their series when a host is removed.
+downsamplers = weakref.WeakKeyDictionary()
+downsamplers_lock = threading.Lock()
+
+
+def target_points(width):
+    """
+    The number of points to draw on a chart `width` pixels wide,
+    rounded so that similar screen sizes share downsamplers.
+    """
+    return max(256, (width or 0) // 256 * 256)
+
+
+def downsample(series, target):
+    """Returns the points of `series`, downsampled to about `target`."""
+    with downsamplers_lock:
+        by_target = downsamplers.setdefault(series, {})
+        downsampler = by_target.get(target)
+        if downsampler is None:
+            downsampler = by_target[target] = Downsampler(series, target)
+    return downsampler.update()
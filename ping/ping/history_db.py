@@ -0,0 +1,155 @@
+import queue
+import threading
+import time
+import hyperdiv as hd
+from hyperdiv.sqlite import sqlite, sqlite_tx, migrate, sql
+from . import config
+
+db = config.history_db
+
+migrations = [
+    sql(
+        """
+        create table Sample (
+            host text not null,
+            ts int not null,
+            latency real,
+            primary key (host, ts)
+        ) without rowid
+        """
+    ),
+    sql("create index SampleTs on Sample (ts)"),
+]
+
+
+def migrate_history_db():
+    migrate(db, migrations)
+    # WAL lets the chart read while the writer is appending.
+    with sqlite(db) as (_, cursor):
+        cursor.execute("pragma journal_mode = wal")
+
+
+def write_samples(rows):
+    """
+    Writes `(host, ts, latency)` rows in a single transaction, so the
+    cost of committing is paid once per batch, not once per sample.
+    """
+    with sqlite_tx(db) as (_, cursor):
+        cursor.executemany(
+            """
+            insert or replace into Sample (host, ts, latency)
+            values (?, ?, ?)
+            """,
+            rows,
+        )
+
+
+def delete_samples_before(ts):
+    with sqlite(db) as (_, cursor):
+        cursor.execute("delete from Sample where ts < ?", (ts,))
+
+
+def query_range(host, start, end, max_points=None):
+    """
+    Returns the `(ts, latency)` samples of `host` with timestamps in
+    `[start, end)`, in time order. If `max_points` is given, the range
+    is split into about `max_points / 2` buckets, and only the lowest
+    and highest sample in each bucket is returned, plus its first
+    failed ping, if any, so that gaps in the line are preserved, as
+    in `downsample.bucket_points`.
+    """
+    with sqlite(db) as (_, cursor):
+        if max_points is None:
+            cursor.execute(
+                """
+                select ts, latency from Sample
+                where host = ? and ts >= ? and ts < ?
+                order by ts
+                """,
+                (host, start, end),
+            )
+        else:
+            bucket_ms = max(1, (end - start) * 2 // max_points)
+            # In SQLite, the bare `ts` column in an aggregate query
+            # comes from the row that has the min()/max() value. min()
+            # and max() skip failed pings, whose latency is null, so
+            # each bucket's first failure is selected separately.
+            cursor.execute(
+                """
+                select ts, latency from (
+                    select ts, min(latency) as latency from Sample
+                    where host = ? and ts >= ? and ts < ?
+                    group by ts / ?
+                    union
+                    select ts, max(latency) as latency from Sample
+                    where host = ? and ts >= ? and ts < ?
+                    group by ts / ?
+                    union
+                    select min(ts) as ts, null as latency from Sample
+                    where host = ? and ts >= ? and ts < ? and latency is null
+                    group by ts / ?
+                )
+                order by ts
+                """,
+                (host, start, end, bucket_ms) * 3,
+            )
+        return [(row["ts"], row["latency"]) for row in cursor.fetchall()]
+
+
+class HistoryWriter:
+    """
+    Persists samples on a background thread. The ping task hands over
+    each batch of samples with `append`, which only enqueues it, so
+    the probe loop never waits on the disk. The writer drains
+    everything that is queued and writes it in one transaction.
+    """
+
+    # How often to delete samples older than the retention period,
+    # in seconds.
+    prune_interval = 3600
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.last_prune = 0
+
+    def append(self, samples):
+        """Queues a list of `(host, ts, latency)` samples to be written."""
+        self.start()
+        self.queue.put(samples)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name="ping-history", daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+        while True:
+            rows = list(self.queue.get())
+            try:
+                while True:
+                    rows += self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            try:
+                write_samples(rows)
+            except Exception as e:
+                hd.logger.warn(f"Failed to persist {len(rows)} samples: {e}")
+
+            now = time.time()
+            if now - self.last_prune > self.prune_interval:
+                self.last_prune = now
+                try:
+                    delete_samples_before(
+                        int((now - config.retention_days * 86400) * 1000)
+                    )
+                except Exception as e:
+                    hd.logger.warn(f"Failed to prune samples: {e}")
+
+
+history_writer = HistoryWriter()
@@ -1,15 +1,65 @@
+import time
 import hyperdiv as hd
 from .state import PingState
 from .ping_task import ping_task
 from .data_table import data_table
+from .downsample import downsample, target_points
+from .history_db import query_range
+from .bulk_import import parse_hosts, check_hosts
+
+# The time windows the chart can show, in seconds. "Live" shows the
+# in-memory samples, and the others are read from the database.
+chart_windows = {
+    "Live": None,
+    "1 hour": 3600,
+    "6 hours": 6 * 3600,
+    "24 hours": 24 * 3600,
+}
+
+
+def query_history(hosts, duration, max_points):
+    end = int(time.time() * 1000)
+    start = end - duration * 1000
+    return {host: query_range(host, start, end, max_points) for host in hosts}
 
 
 def chart():
     state = PingState()
+    window = hd.window()
+    ping_values = state.get_ping_values()
+    # The time window shown on the chart, chosen by each session.
+    view = hd.state(chart_window="Live")
+
+    # Send the browser about as many points as the chart has pixels
+    # to draw them, rather than the whole history.
+    target = target_points(window.width)
+
+    with hd.hbox(justify="end", align="center", gap=0.5):
+        history_task = hd.task()
+        if chart_windows[view.chart_window] is not None:
+            if hd.icon_button(
+                "arrow-clockwise", disabled=history_task.running
+            ).clicked:
+                history_task.clear()
+        selector = hd.radio_group(
+            button_options=tuple(chart_windows),
+            value=view.chart_window,
+        )
+        if selector.changed:
+            view.chart_window = selector.value
+            history_task.clear()
+
+    duration = chart_windows[view.chart_window]
+    if duration is None:
+        datasets = [downsample(series, target) for series in ping_values.values()]
+    else:
+        history_task.run(query_history, tuple(ping_values), duration, target)
+        history = history_task.result or {}
+        datasets = [history.get(host, ()) for host in ping_values]
 
     hd.line_chart(
-        *state.ping_values.values(),
-        labels=tuple(state.ping_values.keys()),
+        *datasets,
+        labels=tuple(ping_values.keys()),
         x_axis="timeseries",
         padding=1,
         background_color="neutral-50",
@@ -38,18 +88,73 @@ def start_pause_button():
                 state.stop_event.set()
 
 
+def import_hosts(text):
+    """
+    Returns `(valid, invalid)`, where `valid` maps each host that can
+    be pinged to its interval. See `check_hosts`.
+    """
+    hosts = parse_hosts(text)
+    valid, invalid = check_hosts(hosts)
+    return {host: hosts[host] for host in valid}, invalid
+
+
+def import_hosts_dialog(dialog):
+    state = PingState()
+    import_task = hd.task()
+
+    with dialog:
+        with hd.box(gap=1):
+            with hd.form(gap=1) as form:
+                form.textarea(
+                    "Hostnames, separated by newlines, spaces or commas. "
+                    "A number after a host sets its ping interval, in seconds.",
+                    name="hosts",
+                    rows=10,
+                    required=True,
+                )
+                form.submit_button(
+                    "Import", variant="primary", disabled=import_task.running
+                )
+
+            if form.submitted:
+                import_task.rerun(import_hosts, form.form_data["hosts"])
+
+            if import_task.running:
+                hd.spinner()
+            elif import_task.done and import_task.result:
+                valid, invalid = import_task.result
+                hd.text(f"Added {len(valid)} hosts.")
+                if invalid:
+                    hd.text(f"Skipped {len(invalid)} hosts:", font_color="red")
+                    with hd.box(height=10, vertical_scroll=True):
+                        for host, error in list(invalid.items())[:100]:
+                            with hd.scope(host):
+                                hd.text(f"{host}: {error}", font_size="small")
+
+    if import_task.finished:
+        valid, _ = import_task.result
+        state.add_hosts(valid)
+        form.reset()
+
+
 def add_host_form():
     state = PingState()
+    import_dialog = hd.dialog("Import Hosts")
 
-    # The form for adding a new host.
-    with hd.form() as form:
-        form.text_input(placeholder="Add a host", name="host")
+    with hd.hbox(gap=1, align="center"):
+        # The form for adding a new host.
+        with hd.form(grow=1) as form:
+            form.text_input(placeholder="Add a host", name="host")
+        if hd.button("Import Hosts", prefix_icon="upload").clicked:
+            import_dialog.opened = True
 
     if form.submitted:
         host = form.form_data["host"]
         state.add_host(host)
         form.reset()
 
+    import_hosts_dialog(import_dialog)
+
 
 def main():
     app = hd.template(title="Ping", sidebar=False)
@@ -1,36 +1,113 @@
 import hyperdiv as hd
 import time
-import subprocess
+from concurrent.futures import wait, FIRST_COMPLETED
+from . import config
 from .state import PingState
+from .probe_pool import get_probe_pool
+from .scheduler import Scheduler
+from .history_db import history_writer
 
+# The pool is shared by all runs of the task so its workers are
+# reused. Its capacity is the cap on concurrent pings. It is created
+# on first use, so that importing this module doesn't start worker
+# processes.
+probe_pool = None
 
-def ping(hostname):
-    p = subprocess.Popen(["ping", "-c", "1", hostname], stdout=subprocess.PIPE)
-    out, err = p.communicate()
-    return float(out.split(b"\n")[1].split(b" ")[-2].split(b"=")[1])
+# How often to publish the samples collected so far, in seconds.
+# Batching them keeps the UI from re-rendering on every single ping.
+publish_interval = 0.25
+# The longest the task waits before checking whether it was stopped.
+poll_interval = 0.1
+
+
+def get_probe_pool_once():
+    global probe_pool
+    if probe_pool is None:
+        probe_pool = get_probe_pool(config)
+    return probe_pool
+
+
+def get_results(hosts, future):
+    """Returns the ping values of the hosts in a finished batch."""
+    try:
+        results = future.result()
+    except Exception as e:
+        results = [(None, str(e))] * len(hosts)
+
+    ping_values = []
+    for host, (ping_value, error) in zip(hosts, results):
+        if error is not None:
+            hd.logger.warn(f"Ping Failed for {host}: {error}")
+        ping_values.append(ping_value)
+    return ping_values
 
 
 def ping_task():
+    pool = get_probe_pool_once()
     state = PingState()
     state.stop_event.clear()
+    # While the task runs, it applies host additions and removals on
+    # each pass of its loop.
+    state.start_consuming()
+
+    scheduler = Scheduler(config.ping_interval, config.max_backoff, config.jitter)
+    # Maps each in-flight batch's future to (hosts, timestamp).
+    in_flight = {}
+    num_in_flight = 0
+    samples = []
+    last_publish = time.monotonic()
+    ping_values = None
+
+    try:
+        while not state.stop_event.is_set():
+            now = time.monotonic()
+
+            # Apply queued host changes right away, rather than with
+            # the next batch of samples, which may be a long wait when
+            # every host is backing off.
+            state.apply_commands()
 
-    while True:
-        now = int(time.time() * 1000)
+            # The host dict is only replaced when hosts are added or
+            # removed.
+            snapshot = state.get_snapshot()
+            if snapshot.ping_values is not ping_values:
+                ping_values = snapshot.ping_values
+                scheduler.sync(ping_values, now, snapshot.intervals)
 
-        # Get a copy of the ping values
-        ping_values = state.get_ping_values()
+            # Start the pings that are due, up to the concurrency cap.
+            due = scheduler.pop_due(now, pool.capacity - num_in_flight)
+            if due:
+                timestamp = int(time.time() * 1000)
+                for future, hosts in pool.submit(due):
+                    in_flight[future] = (hosts, timestamp)
+                num_in_flight += len(due)
 
-        # Update the copy
-        for host in ping_values:
-            try:
-                ping_value = ping(host)
-            except Exception as e:
-                hd.logger.warn(f"Ping Failed for {host}: {e}")
-                ping_value = None
-            ping_values[host] = ping_values[host][-20:] + ((now, ping_value),)
+            # Wait for a ping to finish or the next host to be due.
+            next_due = scheduler.next_due()
+            timeout = poll_interval
+            if next_due is not None and num_in_flight < pool.capacity:
+                timeout = min(timeout, max(0, next_due - now))
+            if in_flight:
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            else:
+                done = ()
+                state.stop_event.wait(timeout)
 
-        # Update the master with the copy
-        state.update_ping_values(ping_values)
+            now = time.monotonic()
+            for future in done:
+                hosts, timestamp = in_flight.pop(future)
+                num_in_flight -= len(hosts)
+                for host, ping_value in zip(hosts, get_results(hosts, future)):
+                    scheduler.reschedule(host, ping_value is not None, now)
+                    samples.append((host, timestamp, ping_value))
 
-        if state.stop_event.wait(1):
-            break
+            if samples and now - last_publish >= publish_interval:
+                state.add_samples(samples)
+                history_writer.append(samples)
+                samples = []
+                last_publish = now
+    finally:
+        if samples:
+            state.add_samples(samples)
+            history_writer.append(samples)
+        state.stop_consuming()
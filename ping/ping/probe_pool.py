@@ -0,0 +1,103 @@
+import zlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .probers import get_prober
+
+# Probe pools run pings on behalf of the ping task. `submit(hosts)`
+# starts pinging `hosts` and returns a list of `(future, hosts)`
+# pairs, where each future resolves to a list with one `(ping_value,
+# error)` pair per host in its `hosts`. `capacity` is the number of
+# hosts the pool can ping at the same time.
+
+
+def probe(prober, timeout, host):
+    try:
+        return prober.probe(host, timeout), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+
+class ThreadProbePool:
+    """Pings each host on a thread pool in the app process."""
+
+    def __init__(self, prober, timeout, workers):
+        self.prober = prober
+        self.timeout = timeout
+        self.capacity = workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ping"
+        )
+
+    def probe_batch(self, hosts):
+        return [probe(self.prober, self.timeout, host) for host in hosts]
+
+    def submit(self, hosts):
+        return [(self.executor.submit(self.probe_batch, [h]), [h]) for h in hosts]
+
+
+# The state of a shard's worker process, set up by `init_shard`.
+shard_pool = None
+
+
+def init_shard(prober_name, tcp_port, timeout, workers):
+    global shard_pool
+    shard_pool = ThreadProbePool(
+        get_prober(prober_name, tcp_port=tcp_port), timeout, workers
+    )
+
+
+def probe_shard_batch(hosts):
+    pool = shard_pool
+    return list(pool.executor.map(lambda h: probe(pool.prober, pool.timeout, h), hosts))
+
+
+class ShardedProbePool:
+    """
+    Splits the hosts across `num_shards` worker processes, each
+    pinging its hosts on its own thread pool, so pinging thousands of
+    hosts isn't limited by one process's CPU. A host always goes to
+    the same shard. The due hosts of a shard are sent as one batch,
+    whose results come back together once its slowest host is done.
+    """
+
+    def __init__(self, prober_name, tcp_port, timeout, workers, num_shards):
+        # Spawn the workers rather than forking the app server.
+        context = multiprocessing.get_context("spawn")
+        self.shards = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=init_shard,
+                initargs=(prober_name, tcp_port, timeout, workers),
+            )
+            for _ in range(num_shards)
+        ]
+        self.capacity = workers * num_shards
+
+    def shard_of(self, host):
+        return zlib.crc32(host.encode("utf-8")) % len(self.shards)
+
+    def submit(self, hosts):
+        batches = {}
+        for host in hosts:
+            batches.setdefault(self.shard_of(host), []).append(host)
+        return [
+            (self.shards[shard].submit(probe_shard_batch, batch), batch)
+            for shard, batch in batches.items()
+        ]
+
+
+def get_probe_pool(config):
+    if config.shards > 0:
+        return ShardedProbePool(
+            config.prober,
+            config.tcp_port,
+            config.ping_timeout,
+            config.max_workers,
+            config.shards,
+        )
+    return ThreadProbePool(
+        get_prober(config.prober, tcp_port=config.tcp_port),
+        config.ping_timeout,
+        config.max_workers,
+    )
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import socket
+import struct
+import itertools
+import subprocess
+from .dns_cache import dns_cache
+
+# Probers measure the round-trip latency to a host. Each prober has a
+# `probe(hostname, timeout)` method that returns the latency in
+# milliseconds, or raises an exception if the host couldn't be
+# reached within `timeout` seconds.
+
+
+class SubprocessProber:
+    """
+    Runs the system `ping` command once per probe. This forks a
+    process for every sample, but works wherever `ping` is installed.
+    """
+
+    time_re = re.compile(rb"time[=<]\s*([\d.]+)")
+
+    def probe(self, hostname, timeout):
+        # `subprocess.run` kills the ping process if it runs past the
+        # timeout, so a hung host can't occupy a worker forever.
+        p = subprocess.run(
+            ["ping", "-c", "1", hostname],
+            stdout=subprocess.PIPE,
+            timeout=timeout,
+        )
+        match = self.time_re.search(p.stdout)
+        if not match:
+            raise Exception("No reply")
+        return float(match.group(1))
+
+
+class IcmpProber:
+    """
+    Sends an ICMP echo request from within the process, using an
+    unprivileged datagram ICMP socket. On Linux, this requires the
+    user's group to be in the `net.ipv4.ping_group_range` sysctl.
+    """
+
+    # (socket family, protocol, echo request type, echo reply type)
+    families = {
+        socket.AF_INET: (socket.IPPROTO_ICMP, 8, 0),
+        socket.AF_INET6: (socket.IPPROTO_ICMPV6, 128, 129),
+    }
+
+    def __init__(self):
+        self.sequence = itertools.count(1)
+
+    @staticmethod
+    def is_permitted():
+        try:
+            socket.socket(
+                socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP
+            ).close()
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def checksum(data):
+        if len(data) % 2:
+            data += b"\0"
+        total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+        total = (total >> 16) + (total & 0xFFFF)
+        total += total >> 16
+        return ~total & 0xFFFF
+
+    def probe(self, hostname, timeout):
+        family, _, _, _, address = dns_cache.getaddrinfo(
+            hostname, None, type=socket.SOCK_DGRAM
+        )[0]
+        proto, request_type, reply_type = self.families[family]
+
+        # The kernel replaces the identifier with the socket's port,
+        # and uses it to route replies to this socket.
+        sequence = next(self.sequence) & 0xFFFF
+        payload = os.urandom(16)
+        header = struct.pack("!BBHHH", request_type, 0, 0, 0, sequence)
+        checksum = self.checksum(header + payload)
+        packet = struct.pack("!BBHHH", request_type, 0, checksum, 0, sequence)
+
+        deadline = time.monotonic() + timeout
+        with socket.socket(family, socket.SOCK_DGRAM, proto) as sock:
+            start = time.perf_counter()
+            sock.sendto(packet + payload, address)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out")
+                sock.settimeout(remaining)
+                data = sock.recv(1024)
+                # Some platforms include the IPv4 header in the
+                # reply. Skip it, if present.
+                if family == socket.AF_INET and data[0] >> 4 == 4:
+                    data = data[(data[0] & 0x0F) * 4 :]
+                if (
+                    len(data) >= 8
+                    and data[0] == reply_type
+                    and struct.unpack("!H", data[6:8])[0] == sequence
+                    and data[8:] == payload
+                ):
+                    return (time.perf_counter() - start) * 1000
+
+
+class TcpProber:
+    """
+    Measures the time it takes to open a TCP connection to the
+    host. A refused connection still counts as a reply, since the host
+    had to respond to refuse it.
+    """
+
+    def __init__(self, port):
+        self.port = port
+
+    def probe(self, hostname, timeout):
+        family, kind, proto, _, address = dns_cache.getaddrinfo(
+            hostname, self.port, type=socket.SOCK_STREAM
+        )[0]
+        with socket.socket(family, kind, proto) as sock:
+            sock.settimeout(timeout)
+            start = time.perf_counter()
+            try:
+                sock.connect(address)
+            except ConnectionRefusedError:
+                pass
+            return (time.perf_counter() - start) * 1000
+
+
+def get_prober(name, tcp_port=443):
+    """Returns the prober selected by `name`. See `config.prober`."""
+    if name == "native":
+        name = "icmp" if IcmpProber.is_permitted() else "tcp"
+    if name == "icmp":
+        return IcmpProber()
+    if name == "tcp":
+        return TcpProber(tcp_port)
+    if name == "subprocess":
+        return SubprocessProber()
+    raise ValueError(f"Unknown prober: {name}")
@@ -0,0 +1,116 @@
+import heapq
+import random
+
+
+class Scheduler:
+    """
+    Decides when each host is pinged next. Hosts are kept in a
+    priority queue keyed by the time they are next due, so finding the
+    due hosts doesn't scan all of them.
+
+    Each host is pinged every `interval` seconds, unless it was given
+    its own interval when imported. A host that keeps failing backs
+    off exponentially, up to `max_backoff` seconds, and returns to its
+    interval on its first success. Every delay is randomly stretched or shrunk by up to
+    `jitter` (a fraction of the delay), so hosts added together don't
+    keep getting pinged in synchronized bursts.
+
+    The scheduler isn't thread-safe; it is owned by the ping task.
+    """
+
+    def __init__(self, interval, max_backoff, jitter=0.1):
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        # Entries are [due, hostname]. Removed or rescheduled hosts
+        # leave stale entries behind, which are skipped when popped.
+        self.heap = []
+        # Maps hostname to its current heap entry, or to `None` while
+        # the host is being pinged.
+        self.entries = {}
+        self.intervals = {}
+        self.failures = {}
+
+    def _jittered(self, delay):
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, host, due):
+        entry = [due, host]
+        self.entries[host] = entry
+        heapq.heappush(self.heap, entry)
+
+    def add_host(self, host, now):
+        if host in self.entries:
+            return
+        self.failures[host] = 0
+        # Spread the first pings of hosts added at once over the
+        # jitter window.
+        self._push(host, now + random.uniform(0, self.jitter * self.interval))
+
+    def remove_host(self, host):
+        entry = self.entries.pop(host, None)
+        if entry is not None:
+            entry[1] = None
+        self.intervals.pop(host, None)
+        self.failures.pop(host, None)
+
+    def sync(self, hosts, now, intervals=None):
+        """
+        Adds and removes hosts to match `hosts`, and sets their
+        intervals to those in `intervals`. A changed interval applies
+        from the host's next ping.
+        """
+        intervals = intervals or {}
+        for host in [h for h in self.entries if h not in hosts]:
+            self.remove_host(host)
+        for host in hosts:
+            self.add_host(host, now)
+            self.set_interval(host, intervals.get(host))
+
+    def set_interval(self, host, interval):
+        """Sets the interval of `host`. `None` restores the default."""
+        if interval is None:
+            self.intervals.pop(host, None)
+        else:
+            self.intervals[host] = interval
+
+    def next_due(self):
+        """When the next host is due, or `None` if there are no hosts."""
+        while self.heap and self.heap[0][1] is None:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now, limit):
+        """
+        Returns up to `limit` hosts that are due at `now`, most overdue
+        first. The returned hosts are out of the schedule until they
+        are passed to `reschedule`.
+        """
+        hosts = []
+        while self.heap and len(hosts) < limit:
+            due, host = self.heap[0]
+            if host is not None and due > now:
+                break
+            heapq.heappop(self.heap)
+            if host is not None:
+                self.entries[host] = None
+                hosts.append(host)
+        return hosts
+
+    def reschedule(self, host, succeeded, now):
+        """Schedules the next ping of a host popped by `pop_due`."""
+        if self.entries.get(host, False) is not None:
+            # The host was removed while it was being pinged, and
+            # maybe added again, in which case its first ping is
+            # already scheduled.
+            return
+        interval = self.intervals.get(host, self.interval)
+        if succeeded:
+            self.failures[host] = 0
+            delay = interval
+        else:
+            self.failures[host] += 1
+            backoff = 2 ** min(self.failures[host], 32)
+            delay = min(interval * backoff, self.max_backoff)
+            delay = max(delay, interval)
+        self._push(host, now + self._jittered(delay))
@@ -0,0 +1,109 @@
+import math
+from array import array
+from .stats import RollingStats
+
+
+class Series:
+    """
+    A fixed-capacity ring buffer of ping samples for one host. Samples
+    are stored in two typed arrays, millisecond timestamps and float
+    latencies, so appending a sample doesn't allocate. Failed pings are
+    stored as NaN. Once the buffer is full, each new sample overwrites
+    the oldest one. Rolling aggregates over the buffered samples are
+    kept up to date in `stats` as samples come and go.
+
+    The series has a single writer, the ping task. Readers don't lock;
+    they take a `view()`, which stays valid as long as the samples it
+    covers haven't been overwritten.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array("q", bytes(8 * capacity))
+        self.latencies = array("d", bytes(8 * capacity))
+        # The total number of samples ever appended. The sample with
+        # index `i` lives in slot `i % capacity`.
+        self.count = 0
+        self.stats = RollingStats(capacity)
+
+    def append(self, timestamp, latency):
+        slot = self.count % self.capacity
+        latency = math.nan if latency is None else latency
+        if self.count >= self.capacity:
+            self.stats.remove(self.latencies[slot])
+        self.stats.add(self.count, latency)
+        self.timestamps[slot] = timestamp
+        self.latencies[slot] = latency
+        # Publish the sample only after both slots are written.
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def view(self, limit=None):
+        """
+        Returns a read-only view of the most recent samples, at most
+        `limit` of them.
+        """
+        return SeriesView(self, self.count, limit)
+
+    def _read(self, values, start, end):
+        first = start % self.capacity
+        last = first + end - start
+        if last <= self.capacity:
+            return values[first:last].tolist()
+        return values[first:].tolist() + values[: last - self.capacity].tolist()
+
+    def read(self, start, end):
+        """
+        Reads the samples with indices in `[start, end)`, which must
+        have been appended. Returns `(start, timestamps, latencies)`,
+        where `start` is moved forward past any samples that were
+        overwritten before or while they were read.
+        """
+        start = max(start, end - self.capacity)
+        timestamps = self._read(self.timestamps, start, end)
+        latencies = self._read(self.latencies, start, end)
+        # If the writer lapped the reader, the oldest samples were
+        # overwritten. Drop them. The writer fills the slot of sample
+        # `count` before it increments `count`, so that slot may be
+        # half written, and counts as overwritten too.
+        overwritten = self.count + 1 - self.capacity - start
+        if overwritten > 0:
+            start += overwritten
+            del timestamps[:overwritten]
+            del latencies[:overwritten]
+        return start, timestamps, latencies
+
+
+class SeriesView:
+    """
+    A read-only view of the samples of a `Series` that had been
+    appended when the view was taken. Iterating yields `(timestamp,
+    latency)` tuples, with `None` latencies for failed pings, which is
+    the format `hd.line_chart` expects.
+    """
+
+    def __init__(self, series, end, limit=None):
+        self.series = series
+        self.end = end
+        size = min(end, series.capacity)
+        if limit is not None:
+            size = min(size, limit)
+        self.start = end - size
+
+    def __len__(self):
+        return self.end - self.start
+
+    def timestamps(self):
+        return self.series.read(self.start, self.end)[1]
+
+    def latencies(self):
+        """The latencies in the view, with NaN for failed pings."""
+        return self.series.read(self.start, self.end)[2]
+
+    def __iter__(self):
+        _, timestamps, latencies = self.series.read(self.start, self.end)
+        return (
+            (t, None if math.isnan(v) else v) for t, v in zip(timestamps, latencies)
+        )
@@ -0,0 +1,154 @@
+import queue
+import threading
+from types import MappingProxyType
+from typing import NamedTuple, Mapping
+from .series import Series
+
+
+class Snapshot(NamedTuple):
+    """An immutable, versioned view of the monitored hosts."""
+
+    version: int
+    # Maps hostname to the `Series` holding its samples.
+    ping_values: Mapping[str, Series]
+    # Maps hostname to its ping interval, in seconds, for the hosts
+    # that don't use the default `config.ping_interval`.
+    intervals: Mapping[str, float]
+
+
+def host_intervals(hosts):
+    """
+    Returns `(host, interval)` pairs for `hosts`, which is either an
+    iterable of hostnames or a mapping of hostnames to their interval,
+    or `None` for the default.
+    """
+    if isinstance(hosts, Mapping):
+        return tuple(hosts.items())
+    return tuple((host, None) for host in hosts)
+
+
+class SnapshotPublisher:
+    """
+    Publishes the set of monitored hosts and their samples as
+    immutable `Snapshot`s. Publishing swaps the `snapshot` reference,
+    so readers just read it, without locking, and never wait on a
+    writer.
+
+    Host additions and removals are queued as commands. While the
+    ping task is running, it is the consumer of the queue and applies
+    the commands on each pass of its loop, so adding or removing a
+    host from the render thread never waits for pings. While the task
+    is stopped, the thread queueing a command applies it right away.
+    """
+
+    def __init__(self, hosts, capacity, on_publish=None):
+        self.capacity = capacity
+        self.on_publish = on_publish
+        self.commands = queue.SimpleQueue()
+        # Serializes writers. Readers never take it.
+        self.lock = threading.Lock()
+        # Whether the ping task is consuming the commands.
+        self.consuming = False
+        hosts = host_intervals(hosts)
+        self.snapshot = Snapshot(
+            0,
+            MappingProxyType({h: Series(capacity) for h, _ in hosts}),
+            MappingProxyType({h: i for h, i in hosts if i is not None}),
+        )
+
+    def _publish(self, ping_values, intervals):
+        self.snapshot = Snapshot(self.snapshot.version + 1, ping_values, intervals)
+        if self.on_publish:
+            self.on_publish(self.snapshot)
+
+    def _drain_commands(self):
+        """
+        Applies the queued commands to copies of the current host and
+        interval dicts, and returns the copies, or `None` if no
+        commands were queued.
+        """
+        ping_values = intervals = None
+        # Only drain what's queued now, so a steady stream of
+        # commands can't keep the writer here forever.
+        for _ in range(self.commands.qsize()):
+            command, hosts = self.commands.get_nowait()
+            if ping_values is None:
+                ping_values = dict(self.snapshot.ping_values)
+                intervals = dict(self.snapshot.intervals)
+            if command == "add":
+                # Adding a host that is already monitored only changes
+                # its interval, if one is given.
+                for host, interval in hosts:
+                    if host not in ping_values:
+                        ping_values[host] = Series(self.capacity)
+                    if interval is not None:
+                        intervals[host] = interval
+            elif command == "remove":
+                for host in hosts:
+                    ping_values.pop(host, None)
+                    intervals.pop(host, None)
+        if ping_values is None:
+            return None
+        return MappingProxyType(ping_values), MappingProxyType(intervals)
+
+    def apply_commands(self):
+        """Applies the queued commands, if any."""
+        if self.commands.empty():
+            return
+        with self.lock:
+            drained = self._drain_commands()
+            if drained is not None:
+                self._publish(*drained)
+
+    def _queue_command(self, command, hosts):
+        self.commands.put((command, hosts))
+        # The check happens after queueing the command. If the task
+        # stops after the check, its last `stop_consuming` drain still
+        # sees the command.
+        if not self.consuming:
+            self.apply_commands()
+
+    def start_consuming(self):
+        """Called by the ping task when it starts."""
+        self.consuming = True
+
+    def stop_consuming(self):
+        """
+        Called by the ping task when it exits. Applies any commands
+        queued since its last pass.
+        """
+        self.consuming = False
+        self.apply_commands()
+
+    def add_host(self, host, interval=None):
+        self._queue_command("add", ((host, interval),))
+
+    def add_hosts(self, hosts):
+        """
+        Adds many hosts at once, copying the host dict only once.
+        `hosts` can map each host to its interval. See `host_intervals`.
+        """
+        self._queue_command("add", host_intervals(hosts))
+
+    def remove_host(self, host):
+        self._queue_command("remove", (host,))
+
+    def publish_samples(self, samples):
+        """
+        Appends `(host, timestamp, ping_value)` samples and publishes a
+        new snapshot. This is called only by the ping task, which is
+        the only thread that appends to the series.
+        """
+        with self.lock:
+            # Add samples only for hosts in the current snapshot. It's
+            # possible that while the ping task was pinging, hosts
+            # were deleted or added.
+            current = self.snapshot.ping_values
+            for host, timestamp, ping_value in samples:
+                series = current.get(host)
+                if series is not None:
+                    series.append(timestamp, ping_value)
+            drained = self._drain_commands()
+            if drained is None:
+                drained = current, self.snapshot.intervals
+            self._publish(*drained)
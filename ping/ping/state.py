@@ -1,45 +1,72 @@
 import threading
 import hyperdiv as hd
+from . import config
+from .snapshot import SnapshotPublisher
+
+# The hosts pinged when the app starts, mapped to their ping interval,
+# or `None` for the default. `start.py` can replace them with hosts
+# loaded from a file.
+initial_hosts = {"github.com": None}
 
 
 @hd.global_state
 class PingState(hd.BaseState):
-    # For locking access to `ping_values`, since it is accessed from
-    # both the main thread + the task thread.
-    lock = hd.Prop(hd.Any, None)
+    # Publishes the hosts and their samples as immutable snapshots,
+    # so the render thread never waits for the task thread. See
+    # `snapshot.py`.
+    publisher = hd.Prop(hd.Any, None)
+    # The latest published `Snapshot`. Reading it subscribes the
+    # caller to new snapshots.
+    snapshot = hd.Prop(hd.Any, None)
     # When this event is set, the task exits.
     stop_event = hd.Prop(hd.Any, None)
-    # Maps hostname to a tuple of (timestamp, ping_time) values.
-    ping_values = hd.Prop(hd.Any, {"github.com": ()})
 
     def __init__(self):
         super().__init__()
         # The first time this state is instantiated, we create the
-        # lock and event.
-        if self.lock is None:
-            self.lock = threading.Lock()
+        # publisher and event.
+        if self.publisher is None:
+            self.publisher = SnapshotPublisher(
+                initial_hosts, config.history_depth, on_publish=self.set_snapshot
+            )
+            self.snapshot = self.publisher.snapshot
         if self.stop_event is None:
             self.stop_event = threading.Event()
 
+    def set_snapshot(self, snapshot):
+        self.snapshot = snapshot
+
     def get_ping_values(self):
-        with self.lock:
-            return dict(**self.ping_values)
-
-    def update_ping_values(self, ping_values):
-        with self.lock:
-            # Update values, only for existing hosts. It's possible
-            # that while the ping task was updating its copy of the
-            # data, hosts were deleted or added from the master copy.
-            self.ping_values = {
-                h: ping_values[h] if h in ping_values else self.ping_values[h]
-                for h in self.ping_values
-            }
-
-    def add_host(self, host):
-        with self.lock:
-            if host not in self.ping_values:
-                self.ping_values = self.ping_values | {host: ()}
+        """
+        Returns the read-only mapping of each host to its `Series`
+        from the latest snapshot.
+        """
+        return self.snapshot.ping_values
+
+    def get_snapshot(self):
+        """
+        Returns the latest snapshot without subscribing to it. For use
+        by the ping task.
+        """
+        return self.publisher.snapshot
+
+    def start_consuming(self):
+        self.publisher.start_consuming()
+
+    def stop_consuming(self):
+        self.publisher.stop_consuming()
+
+    def apply_commands(self):
+        self.publisher.apply_commands()
+
+    def add_samples(self, samples):
+        self.publisher.publish_samples(samples)
+
+    def add_host(self, host, interval=None):
+        self.publisher.add_host(host, interval)
+
+    def add_hosts(self, hosts):
+        self.publisher.add_hosts(hosts)
 
     def remove_host(self, host):
-        with self.lock:
-            self.ping_values = {h: v for h, v in self.ping_values.items() if h != host}
+        self.publisher.remove_host(host)
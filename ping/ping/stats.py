@@ -0,0 +1,136 @@
+import math
+from array import array
+from collections import deque
+
+
+class LatencySketch:
+    """
+    A histogram of latencies with logarithmically sized buckets, so
+    that any value is within `accuracy` (relative) of its bucket's
+    midpoint. Samples can be both added and removed in constant time,
+    and quantiles are read with a single pass over the fixed number of
+    buckets, independent of the number of samples.
+    """
+
+    def __init__(self, accuracy=0.02, min_value=0.01, max_value=100_000):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.offset = self._raw_index(min_value)
+        size = self._raw_index(max_value) - self.offset + 1
+        self.counts = array("l", bytes(array("l").itemsize * size))
+        self.total = 0
+
+    def _raw_index(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def _index(self, value):
+        index = self._raw_index(max(value, self.min_value)) - self.offset
+        return min(index, len(self.counts) - 1)
+
+    def add(self, value):
+        self.counts[self._index(value)] += 1
+        self.total += 1
+
+    def remove(self, value):
+        self.counts[self._index(value)] -= 1
+        self.total -= 1
+
+    def quantiles(self, qs):
+        """
+        Returns the estimated values at each of the quantiles `qs`,
+        which must be sorted in ascending order.
+        """
+        if self.total <= 0:
+            return [None] * len(qs)
+
+        ranks = [q * (self.total - 1) for q in qs]
+        results = []
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            while len(results) < len(ranks) and seen > ranks[len(results)]:
+                # The midpoint of the bucket, in log space.
+                upper = self.gamma ** (index + self.offset)
+                results.append(2 * upper / (self.gamma + 1))
+            if len(results) == len(ranks):
+                break
+        # Readers don't lock, so the counts may be mid-update.
+        results += [results[-1] if results else None] * (len(ranks) - len(results))
+        return results
+
+
+class RollingStats:
+    """
+    Aggregates over the most recent `window` samples of a host,
+    updated in (amortized) constant time as each sample arrives and
+    the oldest one leaves the window. Failed pings are NaN and count
+    towards packet loss but not the latency stats.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        # Monotonic deques of (index, value). The front of each is the
+        # window's min/max.
+        self.min_deque = deque()
+        self.max_deque = deque()
+        self.total = 0.0
+        self.count = 0
+        self.failures = 0
+        self.sketch = LatencySketch()
+
+    def add(self, index, value):
+        """Adds the sample with the given index."""
+        if math.isnan(value):
+            self.failures += 1
+        else:
+            self.total += value
+            self.count += 1
+            self.sketch.add(value)
+            while self.min_deque and self.min_deque[-1][1] >= value:
+                self.min_deque.pop()
+            self.min_deque.append((index, value))
+            while self.max_deque and self.max_deque[-1][1] <= value:
+                self.max_deque.pop()
+            self.max_deque.append((index, value))
+
+        oldest = index - self.window
+        for d in (self.min_deque, self.max_deque):
+            while d and d[0][0] <= oldest:
+                d.popleft()
+
+    def remove(self, value):
+        """Removes the value of the sample leaving the window."""
+        if math.isnan(value):
+            self.failures -= 1
+        else:
+            self.total -= value
+            self.count -= 1
+            self.sketch.remove(value)
+            if self.count == 0:
+                # Reset the sum to avoid accumulating float error.
+                self.total = 0.0
+
+    def summary(self):
+        """
+        Returns a dict with the window's `min`, `max`, `avg`, `p50`,
+        `p95`, `p99` latencies (`None` if there are no successful
+        samples), and `loss`, the percentage of failed pings.
+        """
+        count = self.count
+        samples = count + self.failures
+        try:
+            min_value = self.min_deque[0][1]
+            max_value = self.max_deque[0][1]
+        except IndexError:
+            min_value = max_value = None
+        p50, p95, p99 = self.sketch.quantiles((0.5, 0.95, 0.99))
+        return dict(
+            min=min_value,
+            max=max_value,
+            avg=self.total / count if count else None,
+            p50=p50,
+            p95=p95,
+            p99=p99,
+            loss=100 * self.failures / samples if samples else None,
+        )
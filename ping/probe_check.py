@@ -0,0 +1,67 @@
+"""
+Checks the in-process probers against loopback addresses, so they can
+be tried without network access. It probes a TCP listener and a
+refused port with the TCP prober, which should both count as replies,
+and, when unprivileged ICMP sockets are permitted, pings 127.0.0.1
+and ::1 with the ICMP prober.
+
+Usage: python probe_check.py [timeout]
+"""
+
+import sys
+import socket
+from ping.probers import TcpProber, IcmpProber
+
+
+def has_ipv6_loopback():
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+            sock.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+
+def main(timeout=2.0):
+    errors = []
+
+    def check(name, prober, host):
+        try:
+            latency = prober.probe(host, timeout)
+        except Exception as e:
+            errors.append(f"{name}: {e!r}")
+            return
+        print(f"{name}: {latency:.3f}ms")
+        if not 0 <= latency < timeout * 1000:
+            errors.append(f"{name}: latency {latency}ms is out of range")
+
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+        check("tcp, listening", TcpProber(port), "127.0.0.1")
+
+    # A port that was just free, and that nothing listens on.
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    check("tcp, refused", TcpProber(port), "127.0.0.1")
+
+    if IcmpProber.is_permitted():
+        prober = IcmpProber()
+        check("icmp, 127.0.0.1", prober, "127.0.0.1")
+        if has_ipv6_loopback():
+            check("icmp, ::1", prober, "::1")
+        else:
+            print("icmp, ::1: skipped, there is no IPv6 loopback.")
+    else:
+        print("icmp: skipped, unprivileged ICMP sockets aren't permitted.")
+
+    for error in errors:
+        print("ERROR:", error)
+    return not errors
+
+
+if __name__ == "__main__":
+    args = [float(a) for a in sys.argv[1:]]
+    sys.exit(0 if main(*args) else 1)
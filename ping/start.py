@@ -1,4 +1,18 @@
+import sys
 import hyperdiv as hd
 from ping.main import main
+from ping.state import initial_hosts
+from ping.bulk_import import load_hosts_file, check_hosts
+from ping.history_db import migrate_history_db
 
-hd.run(main)
+if __name__ == "__main__":
+    # Optionally, load the hosts to ping from a file.
+    if len(sys.argv) > 1:
+        hosts = load_hosts_file(sys.argv[1])
+        valid, invalid = check_hosts(hosts)
+        for host, error in invalid.items():
+            print(f"Skipping {host}: {error}")
+        initial_hosts.clear()
+        initial_hosts.update((host, hosts[host]) for host in valid)
+    migrate_history_db()
+    hd.run(main)
@@ -0,0 +1,109 @@
+"""
+Stress test for the snapshot publisher shared by the ping task and
+the render thread. A writer thread publishes sweeps for a thousand
+hosts while mutator threads concurrently add and remove hosts and
+reader threads keep reading snapshots. At the end, it checks that no
+host change and no sample was lost, and that readers never saw a
+snapshot go backwards.
+
+Usage: python stress.py [hosts] [sweeps] [mutators] [mutations]
+"""
+
+import sys
+import time
+import random
+import threading
+from ping.snapshot import SnapshotPublisher
+
+
+def main(num_hosts=1000, num_sweeps=200, num_mutators=8, num_mutations=500):
+    initial_hosts = [f"host-{i}" for i in range(num_hosts)]
+    publisher = SnapshotPublisher(initial_hosts, capacity=num_sweeps)
+    # Set when the writer and mutators are done, to stop the readers.
+    done = threading.Event()
+    errors = []
+    max_read_time = [0.0]
+
+    def writer():
+        # Run like the ping task, which stops consuming commands
+        # halfway, so both ways of applying them are exercised.
+        publisher.start_consuming()
+        for t in range(num_sweeps):
+            if t == num_sweeps // 2:
+                publisher.stop_consuming()
+            hosts = publisher.snapshot.ping_values.keys()
+            publisher.publish_samples([(h, t, float(t)) for h in hosts])
+            time.sleep(0.005)
+
+    # Each mutator owns a disjoint set of hosts, and records whether
+    # each one should exist after its last command.
+    expected = {}
+
+    def mutator(i):
+        rng = random.Random(i)
+        hosts = [f"mutator-{i}-{j}" for j in range(100)]
+        present = set()
+        for _ in range(num_mutations):
+            host = rng.choice(hosts)
+            if host in present:
+                publisher.remove_host(host)
+                present.discard(host)
+            else:
+                publisher.add_host(host)
+                present.add(host)
+            time.sleep(0.002)
+        expected[i] = present
+
+    def reader():
+        version = -1
+        while not done.is_set():
+            start = time.perf_counter()
+            snapshot = publisher.snapshot
+            for series in list(snapshot.ping_values.values())[:50]:
+                list(series.view())
+            max_read_time[0] = max(max_read_time[0], time.perf_counter() - start)
+            if snapshot.version < version:
+                errors.append(f"Version went from {version} to {snapshot.version}")
+            version = snapshot.version
+            time.sleep(0.001)
+
+    writers = [threading.Thread(target=writer)]
+    writers += [threading.Thread(target=mutator, args=(i,)) for i in range(num_mutators)]
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+
+    start = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in readers:
+        thread.join()
+    # Apply anything still queued, as the ping task does when it exits.
+    publisher.stop_consuming()
+
+    ping_values = publisher.snapshot.ping_values
+    expected_hosts = set(initial_hosts).union(*expected.values())
+    if set(ping_values) != expected_hosts:
+        lost = expected_hosts.symmetric_difference(ping_values)
+        errors.append(f"{len(lost)} host changes were lost, e.g. {sorted(lost)[:5]}")
+    for host in initial_hosts:
+        if ping_values[host].count != num_sweeps:
+            errors.append(f"{host} has {ping_values[host].count} samples")
+            break
+
+    print(
+        f"{num_sweeps} sweeps of {num_hosts} hosts with "
+        f"{num_mutators}x{num_mutations} host changes "
+        f"in {elapsed:.2f}s, {publisher.snapshot.version} snapshots published, "
+        f"slowest read {max_read_time[0] * 1000:.2f}ms."
+    )
+    for error in errors:
+        print("ERROR:", error)
+    return not errors
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    sys.exit(0 if main(*args) else 1)